@@ -0,0 +1,90 @@
+"""Compares the single-pass symbol extractor with the original recursive AST walk.
+
+Usage: python -m benchmarks.bench_extract [--functions N] [--depth D] [--repeat R]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import clang.cindex
+from preprocessor.preprocess import preprocess_c_file
+from preprocessor.segmentation import extract_symbols
+
+def generate_source(functions, depth):
+    """Generates a C file with structs, macros and functions whose bodies nest `depth` blocks deep."""
+    lines = ["#define SCALE(x) ((x) * 2)"]
+    for i in range(functions):
+        lines.append(f"struct rec_{i} {{ int value; struct rec_{i} *next; }};")
+    for i in range(functions):
+        callee = f"fn_{i - 1}(n - 1)" if i else "n"
+        body = f"return SCALE({callee});"
+        for _ in range(depth):
+            body = f"if (n > 0) {{ {body} }}"
+        lines.append(f"int fn_{i}(int n) {{ struct rec_{i} r; r.value = n; {body} return r.value; }}")
+    return "\n".join(lines) + "\n"
+
+def extract_symbols_recursive(file):
+    """The original extractor: recursive walk over every cursor, including function bodies."""
+    index = clang.cindex.Index.create()
+    translation_unit = index.parse(file)
+    symbols = []
+
+    def traverse(cursor):
+        if cursor.kind in (
+            clang.cindex.CursorKind.FUNCTION_DECL,
+            clang.cindex.CursorKind.STRUCT_DECL,
+            clang.cindex.CursorKind.UNION_DECL,
+            clang.cindex.CursorKind.MACRO_DEFINITION,
+        ):
+            symbol = {
+                "name": cursor.spelling,
+                "kind": cursor.kind.name,
+                "start_line": cursor.extent.start.line,
+                "end_line": cursor.extent.end.line,
+                "dependencies": []
+            }
+            for child in cursor.get_children():
+                if child.kind.is_reference():
+                    symbol["dependencies"].append(child.spelling)
+            symbols.append(symbol)
+
+        for child in cursor.get_children():
+            traverse(child)
+
+    traverse(translation_unit.cursor)
+    return symbols
+
+def best_time(func, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_file = os.path.join(tmp, "bench.c")
+        with open(source_file, "w") as f:
+            f.write(generate_source(args.functions, args.depth))
+        preprocessed_file = preprocess_c_file(source_file, output_dir=tmp)
+
+        new = best_time(extract_symbols, preprocessed_file, args.repeat)
+        print(f"single-pass extractor: {new:.3f}s")
+        try:
+            old = best_time(extract_symbols_recursive, preprocessed_file, args.repeat)
+        except RecursionError:
+            print("recursive extractor:   RecursionError")
+            return 1
+        print(f"recursive extractor:   {old:.3f}s (speedup {old / new:.1f}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
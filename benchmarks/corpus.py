@@ -0,0 +1,137 @@
+"""Generates synthetic multi-unit C projects for benchmarking the pipeline.
+
+Usage: python -m benchmarks.corpus OUTPUT_DIR [--units N] [--functions N] [--structs N]
+       [--macros N] [--include-depth D] [--call-density K] [--cycles C] [--seed S]
+"""
+import os
+import sys
+import random
+import argparse
+
+INCLUDE_DIR = "include"
+SOURCE_DIR = "src"
+
+def header_name(level):
+    return f"level_{level}.h"
+
+def function_name(index):
+    return f"fn_{index}"
+
+def plan_calls(functions, call_density, cycles, rng):
+    """Picks callees for every function.
+
+    Each function calls up to `call_density` earlier functions, so the call
+    graph is acyclic except for `cycles` back edges that each close a loop
+    with a later function (mutual recursion).
+    """
+    calls = [sorted(rng.sample(range(i), min(i, call_density))) for i in range(functions)]
+    for _ in range(min(cycles, functions // 2)):
+        low = rng.randrange(functions - 1)
+        high = rng.randrange(low + 1, functions)
+        if low not in calls[high]:
+            calls[high].append(low)
+        if high not in calls[low]:
+            calls[low].append(high)
+    return calls
+
+def generate_header(level, include_depth, structs, macros):
+    """Builds one guarded header of the include chain; each level includes the next one."""
+    guard = f"BENCH_LEVEL_{level}_H"
+    lines = [f"#ifndef {guard}", f"#define {guard}", ""]
+    if level + 1 < include_depth:
+        lines += [f'#include "{header_name(level + 1)}"', ""]
+    for i in macros:
+        lines.append(f"#define SCALE_{i}(x) ((x) * {i % 7 + 2} + {i})")
+    for i in structs:
+        lines.append(f"struct rec_{i} {{ int value; long weight; struct rec_{i} *next; }};")
+    lines += ["", f"#endif /* {guard} */", ""]
+    return "\n".join(lines)
+
+def generate_function(index, callees, structs, macros, rng):
+    """Builds one function definition that uses a struct, a macro and calls its callees."""
+    body = []
+    if structs:
+        struct = rng.choice(structs)
+        body.append(f"    struct rec_{struct} r = {{ n, 0, 0 }};")
+        value = "r.value"
+    else:
+        value = "n"
+    if macros:
+        value = f"SCALE_{rng.choice(macros)}({value})"
+    body.append(f"    int acc = {value};")
+    for callee in callees:
+        body.append(f"    if (n > 0) acc += {function_name(callee)}(n - 1);")
+    body.append("    for (int i = 0; i < n % 8; i++) { acc ^= i << (acc & 3); }")
+    body.append("    return acc;")
+    return "\n".join([f"int {function_name(index)}(int n) {{"] + body + ["}", ""])
+
+def generate_corpus(output_dir, units=4, functions=200, structs=40, macros=40, include_depth=3,
+                    call_density=2, cycles=4, seed=0):
+    """Writes a synthetic C project to output_dir and returns the paths of its .c files.
+
+    Structs and macros are spread over a chain of `include_depth` guarded
+    headers under include/; the deepest header declares every function so
+    calls resolve across units. Functions are spread round-robin over the
+    units under src/. The same arguments always produce the same project.
+    """
+    rng = random.Random(seed)
+    include_depth = max(1, include_depth)
+    include_dir = os.path.join(output_dir, INCLUDE_DIR)
+    source_dir = os.path.join(output_dir, SOURCE_DIR)
+    os.makedirs(include_dir, exist_ok=True)
+    os.makedirs(source_dir, exist_ok=True)
+
+    for level in range(include_depth):
+        header = generate_header(level, include_depth, range(level, structs, include_depth),
+                                 range(level, macros, include_depth))
+        if level == include_depth - 1:
+            prototypes = "".join(f"int {function_name(i)}(int n);\n" for i in range(functions))
+            header = header.replace("\n#endif", f"\n{prototypes}\n#endif")
+        with open(os.path.join(include_dir, header_name(level)), "w") as f:
+            f.write(header)
+
+    calls = plan_calls(functions, call_density, cycles, rng)
+    struct_ids, macro_ids = list(range(structs)), list(range(macros))
+    bodies = [[] for _ in range(units)]
+    for i in range(functions):
+        bodies[i % units].append(generate_function(i, calls[i], struct_ids, macro_ids, rng))
+
+    sources = []
+    for unit, unit_bodies in enumerate(bodies):
+        path = os.path.join(source_dir, f"unit_{unit}.c")
+        with open(path, "w") as f:
+            f.write(f'#include "../{INCLUDE_DIR}/{header_name(0)}"\n\n')
+            f.write("\n".join(unit_bodies))
+        sources.append(path)
+    return sources
+
+def add_corpus_arguments(parser):
+    """Adds the corpus shape options shared by the generator and the benchmark runner."""
+    parser.add_argument("--units", type=int, default=4, help="number of .c translation units")
+    parser.add_argument("--functions", type=int, default=200, help="function definitions across all units")
+    parser.add_argument("--structs", type=int, default=40, help="struct definitions across all headers")
+    parser.add_argument("--macros", type=int, default=40, help="function-like macros across all headers")
+    parser.add_argument("--include-depth", type=int, default=3, help="length of the header include chain")
+    parser.add_argument("--call-density", type=int, default=2, help="calls from each function to earlier ones")
+    parser.add_argument("--cycles", type=int, default=4, help="mutually recursive function pairs")
+    parser.add_argument("--seed", type=int, default=0)
+
+def corpus_options(args):
+    return {
+        "units": args.units, "functions": args.functions, "structs": args.structs, "macros": args.macros,
+        "include_depth": args.include_depth, "call_density": args.call_density,
+        "cycles": args.cycles, "seed": args.seed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output_dir")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    sources = generate_corpus(args.output_dir, **corpus_options(args))
+    print(f"Wrote {len(sources)} units to {os.path.join(args.output_dir, SOURCE_DIR)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Times every pipeline stage on a synthetic C project and records the results as JSON.
+
+Usage: python -m benchmarks.run_benchmarks [corpus options] [--latency S] [--workers N]
+       [--repeat R] [--output FILE] [--compare BASELINE]
+
+Translation uses the offline FakeTranslator, so no network access is needed.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from benchmarks.corpus import generate_corpus, add_corpus_arguments, corpus_options
+from preprocessor.preprocess import preprocess_c_file
+from preprocessor.segmentation import (extract_symbols, segment_code, merge_shared_symbols, assign_segment_ids,
+                                       build_dependency_graph)
+from preprocessor.parse_cache import extract_symbols_cached
+from preprocessor.metadata import generate_metadata
+from preprocessor.project import unit_name
+from preprocessor.profiling import peak_rss
+from translator.translator import process_segments
+from translator.fake import FakeTranslator
+from translator.writer import RustOutputWriter
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STAGES = ("preprocess", "extract_symbols", "segment_code", "build_dependency_graph",
+          "generate_metadata", "translate", "write_output")
+
+class StageTimer:
+    """Accumulates wall-clock time per stage over one pipeline run."""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+    def time(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.seconds[stage] += time.perf_counter() - start
+        return result
+
+def run_pipeline(sources, work_dir, latency, workers, pack_tokens):
+    """Runs the whole pipeline once over the given units; returns stage timings and sizes."""
+    timer = StageTimer()
+    root = os.path.commonpath([os.path.dirname(source) for source in sources])
+    symbols = []
+    preprocessed_bytes = 0
+    for source in sources:
+        name = unit_name(source, root)
+        unit_dir = os.path.join(work_dir, "units", name)
+        preprocessed_file = timer.time("preprocess", preprocess_c_file, source, output_dir=unit_dir)
+        preprocessed_bytes += os.path.getsize(preprocessed_file)
+        unit_symbols = timer.time("extract_symbols", extract_symbols, preprocessed_file)
+        for symbol in unit_symbols:
+            symbol.unit = name
+        timer.time("segment_code", segment_code, preprocessed_file, unit_symbols, output_dir=unit_dir)
+        symbols.extend(unit_symbols)
+
+    symbols = merge_shared_symbols(symbols)
+    assign_segment_ids(symbols)
+    graph = timer.time("build_dependency_graph", build_dependency_graph, symbols)
+    metadata_file = timer.time("generate_metadata", generate_metadata, symbols, graph,
+                               output_dir=work_dir, token_budget=pack_tokens)
+
+    with open(metadata_file, "r") as f:
+        metadata = json.load(f)
+    rust_dir = os.path.join(work_dir, "rust")
+    os.makedirs(rust_dir, exist_ok=True)
+    writer = RustOutputWriter(metadata, metadata_file, rust_dir, os.path.join(rust_dir, "output.rs"))
+    timer.time("translate", process_segments, metadata_file, translate=FakeTranslator(latency=latency),
+               max_workers=workers, on_complete=writer.complete)
+    timer.time("write_output", writer.close)
+
+    return timer.seconds, {
+        "units": len(sources),
+        "preprocessed_bytes": preprocessed_bytes,
+        "symbols": len(symbols),
+        "segments": len(metadata["segments"]),
+        "batches": len(metadata["batches"]),
+    }
+
+def time_parse_reuse(preprocessed_file, cache_dir, repeat):
+    """Times re-extracting one unit: cold after a small edit, and from the parse cache."""
+    with open(preprocessed_file, "rb") as f:
+        source = f.read()
+    edited = source.replace(b"return acc;", b"return acc + 1;", 1)
+
+    def best(func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return round(min(timings), 6)
+
+    extract_symbols_cached(preprocessed_file, source, cache_dir)
+    return {
+        "cold": best(lambda: extract_symbols(preprocessed_file, source=edited)),
+        "cache_hit": best(lambda: extract_symbols_cached(preprocessed_file, source, cache_dir)),
+    }
+
+def git_commit():
+    """Returns the checked-out commit (with a -dirty suffix for local changes), or None outside git."""
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+def compare(results, baseline):
+    """Prints the best time of every stage next to a baseline result file."""
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for stage in STAGES:
+        new = results["stages"][stage]
+        old = baseline["stages"].get(stage)
+        if old:
+            print(f"  {stage:<24} {old:8.3f}s -> {new:8.3f}s ({new / old:5.2f}x)")
+    if baseline.get("corpus") != results["corpus"]:
+        print("  warning: corpus options differ from the baseline")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_corpus_arguments(parser)
+    parser.add_argument("--latency", type=float, default=0.01, help="stub translator latency per request, in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent translation requests")
+    parser.add_argument("--pack-tokens", type=int, default=None, help="token budget for packing small segments")
+    parser.add_argument("--repeat", type=int, default=3, help="pipeline runs; the best time per stage is kept")
+    parser.add_argument("--output", default=None, help=f"result file (default: {RESULTS_DIR}/<commit>-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sources = generate_corpus(os.path.join(tmp, "corpus"), **corpus_options(args))
+        for run in range(args.repeat):
+            work_dir = os.path.join(tmp, f"run_{run}")
+            seconds, sizes = run_pipeline(sources, work_dir, args.latency, args.workers, args.pack_tokens)
+            runs.append(seconds)
+        preprocessed_file = os.path.join(tmp, "run_0", "units", "unit_0", "preprocessed.c")
+        parse_reuse = time_parse_reuse(preprocessed_file, os.path.join(tmp, "parse_cache"), args.repeat)
+
+    timestamp = datetime.now(timezone.utc)
+    results = {
+        "commit": git_commit(),
+        "timestamp": timestamp.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": corpus_options(args),
+        "translator": {"latency": args.latency, "workers": args.workers, "pack_tokens": args.pack_tokens},
+        "sizes": sizes,
+        "stages": {stage: round(min(run[stage] for run in runs), 6) for stage in STAGES},
+        "runs": [{stage: round(seconds, 6) for stage, seconds in run.items()} for run in runs],
+        "extract_symbols_unit_0": parse_reuse,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+    for stage, seconds in results["stages"].items():
+        print(f"{stage:<24} {seconds:8.3f}s")
+    print("extract_symbols (unit_0): " + ", ".join(f"{name} {seconds:.4f}s" for name, seconds in parse_reuse.items()))
+    print(f"{sizes['units']} units, {sizes['symbols']} symbols, {sizes['segments']} segments, "
+          f"{sizes['preprocessed_bytes']} preprocessed bytes")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{results['commit'] or 'unknown'}-{timestamp:%Y%m%dT%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(results, json.load(f))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
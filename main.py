@@ -1,94 +1,214 @@
 import os
 import logging
 import json
-from preprocessor.preprocess import preprocess_c_file
-from preprocessor.segmentation import extract_symbols, build_dependency_graph, segment_code
+import argparse
+from preprocessor.preprocess import collect_user_includes
+from preprocessor.segmentation import merge_shared_symbols, assign_segment_ids, build_dependency_graph
+from preprocessor.segment_store import SegmentStore
+from preprocessor.profiling import profiler
 from preprocessor.metadata import generate_metadata
-from translator.translator import process_segments
+from preprocessor.project import discover_units, run_project, process_unit, load_unit, CPROFILE_FILE
+from preprocessor.incremental import (load_manifest, save_manifest, fingerprint_inputs, fingerprint_unit,
+                                      is_up_to_date, hash_segments, dirty_segments)
+from translator.translator import process_segments, cache_namespace
+from translator.scheduler import DEFAULT_WORKERS, DEFAULT_RETRIES
+from translator.backends import create_backend, BACKENDS, DEFAULT_HTTP_URL, DEFAULT_HTTP_MODEL
+from translator.cache import TranslationCache, DEFAULT_CACHE_DIR
+from translator.writer import RustOutputWriter
+from translator.journal import RunJournal, load_journal, completed_segments, FAILED
 
 OUTPUT_DIR = "output"
 RUST_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "rust")
 FINAL_RUST_FILE = os.path.join(RUST_OUTPUT_DIR, "output.rs")
 METADATA_FILE = os.path.join(OUTPUT_DIR, "metadata.json")
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, "manifest.json")
+PROFILE_FILE = os.path.join(OUTPUT_DIR, "profile.json")
+JOURNAL_FILE = os.path.join(OUTPUT_DIR, "journal.jsonl")
 
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
 
-def write_rust_file(segment_id, rust_code, metadata):
-    """Writes translated Rust code and updates metadata.json with Rust file path."""
-    rust_file_name = f"{segment_id}.rs"  
-    rust_file_path = os.path.join(RUST_OUTPUT_DIR, rust_file_name)
-
-    os.makedirs(RUST_OUTPUT_DIR, exist_ok=True)
-    with open(rust_file_path, "w") as f:
-        f.write(rust_code)
-
-    logging.info(f"Written Rust code for {segment_id} to {rust_file_path}")
-
-    for segment in metadata["segments"]:
-        if segment["segment_id"] == segment_id:
-            segment["rust_file"] = rust_file_name
-            break
-
-    with open(METADATA_FILE, "w") as f:
-        json.dump(metadata, f, indent=4)
-
-def combine_rust_segments(metadata_file, output_file):
-    """Combines all Rust segments into one output.rs file based on metadata.json."""
-    logging.info("Combining Rust segments into one file...")
-
-    with open(metadata_file, "r") as f:
-        metadata = json.load(f)
-
-    combined_rust_code = ""
-
-    for segment in metadata["segments"]:
-        rust_file_name = segment.get("rust_file", "")
-        rust_file_path = os.path.join(RUST_OUTPUT_DIR, rust_file_name)
-
-        if rust_file_name and os.path.exists(rust_file_path):
-            with open(rust_file_path, "r") as f:
-                combined_rust_code += f.read() + "\n\n"
+def is_project(input_path):
+    """Directories and compile_commands.json files are processed in whole-project mode."""
+    return os.path.isdir(input_path) or os.path.basename(input_path) == "compile_commands.json"
+
+def make_backend(backend, fake_latency=None, backend_url=None, backend_model=None):
+    """Creates the translator backend selected on the command line; --fake-latency implies the offline mock."""
+    if fake_latency is not None:
+        return create_backend("mock", latency=fake_latency)
+    options = {}
+    if backend == "http":
+        options = {"url": backend_url or DEFAULT_HTTP_URL, "model": backend_model or DEFAULT_HTTP_MODEL}
+    elif backend == "gemini" and backend_model:
+        options = {"model_name": backend_model}
+    return create_backend(backend, **options)
+
+def run_pipeline(args, translate):
+    """Runs the front end and translation for the parsed command-line `args` with the given backend."""
+    units = discover_units(args.input) if is_project(args.input) else None
+    unit_files = [[unit["source"], *collect_user_includes(unit["source"], unit["include_dirs"])]
+                  for unit in units or [{"source": args.input, "include_dirs": []}]]
+    input_files = [path for files in unit_files for path in files]
+    if units is not None and os.path.isfile(args.input):
+        input_files.append(args.input)
+
+    manifest = load_manifest(MANIFEST_FILE)
+    settings = {"translator": cache_namespace(translate), "pack_tokens": args.pack_tokens}
+    if manifest["settings"] != settings:
+        # Output of another translator or packing budget cannot be reused
+        manifest["segments"] = {}
+    with profiler.span("fingerprint_inputs"):
+        inputs = fingerprint_inputs(dict.fromkeys(input_files), manifest["inputs"])
+    if args.incremental and not args.resume and is_up_to_date(manifest, inputs, settings) \
+            and os.path.exists(METADATA_FILE) and os.path.exists(FINAL_RUST_FILE):
+        logging.info("Inputs unchanged; Rust output is up to date")
+        return
+
+    parse_cache_dir = None if args.no_parse_cache else args.cache_dir
+    if units is not None:
+        for unit, files in zip(units, unit_files):
+            unit["fingerprint"] = fingerprint_unit(unit, files, inputs)
+        logging.info(f"Processing {len(units)} translation units...")
+        symbols = run_project(units, OUTPUT_DIR, max_workers=args.jobs,
+                              keep_intermediates=args.keep_intermediates, cprofile=args.cprofile,
+                              parse_cache_dir=parse_cache_dir, reuse=args.incremental)
+    else:
+        unit = {"source": args.input, "include_dirs": [], "defines": [], "name": None,
+                "output_dir": OUTPUT_DIR, "keep_intermediates": args.keep_intermediates,
+                "cprofile": args.cprofile, "parse_cache_dir": parse_cache_dir}
+        unit["fingerprint"] = fingerprint_unit(unit, unit_files[0], inputs)
+        symbols = load_unit(unit) if args.incremental else None
+        if symbols is None:
+            logging.info("Preprocessing, extracting symbols and segmenting code...")
+            _, symbols, _ = process_unit(unit)
         else:
-            logging.warning(f"Rust file for segment {segment['segment_id']} not found: {rust_file_path}")
-
-    os.makedirs(RUST_OUTPUT_DIR, exist_ok=True)
-    with open(output_file, "w") as f:
-        f.write(combined_rust_code)
-
-    logging.info(f"Combined Rust code written to {output_file}")
-
-def main(input_file):
-    logging.info("Preprocessing C file...")
-    preprocessed_file = preprocess_c_file(input_file)
-
-    logging.info("Extracting symbols...")
-    symbols = extract_symbols(preprocessed_file)
+            logging.info("Input unchanged; reusing its symbols and segments")
+    symbols = merge_shared_symbols(symbols)
+    assign_segment_ids(symbols)
 
     logging.info("Building dependency graph...")
-    dependency_graph = build_dependency_graph(symbols)
-
-    logging.info("Segmenting code...")
-    segments = segment_code(preprocessed_file, symbols)
+    with profiler.span("build_dependency_graph"):
+        dependency_graph = build_dependency_graph(symbols)
 
     logging.info("Generating metadata...")
-    metadata_file = generate_metadata(symbols, segments)
+    with profiler.span("generate_metadata"):
+        metadata_file = generate_metadata(symbols, dependency_graph, token_budget=args.pack_tokens)
 
     logging.info(f"Preprocessing complete. Segments stored in {OUTPUT_DIR}")
     logging.info(f"Metadata file saved at {metadata_file}")
 
-    rust_segments = process_segments(metadata_file)
-
     with open(metadata_file, "r") as f:
         metadata = json.load(f)
-
-    for segment in metadata["segments"]:
-        segment_id = segment["segment_id"]
-        rust_code = rust_segments.get(segment_id, "// Error: Rust translation missing")
-        write_rust_file(segment_id, rust_code, metadata)
-
-    combine_rust_segments(metadata_file, FINAL_RUST_FILE)
+    profiler.count("segments", len(metadata["segments"]))
+    with profiler.span("hash_segments"):
+        store = SegmentStore()
+        segment_hashes = hash_segments(metadata["segments"], store)
+        store.close()
+
+    segment_ids = None
+    if args.incremental:
+        segment_ids = dirty_segments(segment_hashes, manifest["segments"], RUST_OUTPUT_DIR)
+        logging.info(f"Incremental build: {len(segment_ids)} changed segments, "
+                     f"{len(segment_hashes) - len(segment_ids)} up to date")
+
+    if args.resume:
+        entries = load_journal(JOURNAL_FILE)
+        completed = completed_segments(entries, segment_hashes, RUST_OUTPUT_DIR)
+        failed = sum(entry["status"] == FAILED for entry in entries.values())
+        segment_ids = (segment_ids if segment_ids is not None else set(segment_hashes)) - completed
+        logging.info(f"Resuming: {len(completed)} segments already done, {failed} failed last time, "
+                     f"{len(segment_ids)} to translate")
+
+    writer = RustOutputWriter(metadata, metadata_file, RUST_OUTPUT_DIR, FINAL_RUST_FILE)
+    if segment_ids is not None:
+        for segment in metadata["segments"]:
+            if segment["segment_id"] not in segment_ids:
+                writer.reuse(segment["segment_id"])
+
+    journal = RunJournal(JOURNAL_FILE, segment_hashes, resume=args.resume)
+    cache = None if args.no_cache else TranslationCache(args.cache_dir)
+    try:
+        with profiler.span("translate"):
+            process_segments(metadata_file, translate=translate, max_workers=args.workers,
+                             requests_per_second=args.requests_per_second, retries=args.retries,
+                             cache=cache, segment_ids=segment_ids, on_complete=writer.complete,
+                             batch_size=args.batch_size, batch_tokens=args.batch_tokens, journal=journal)
+    except BaseException:
+        writer.abort()
+        logging.error(f"Run interrupted; finished segments are recorded in {JOURNAL_FILE}, rerun with --resume")
+        raise
+    finally:
+        journal.close()
+        if cache is not None:
+            cache.close()
+
+    with profiler.span("write_output"):
+        writer.close()
+        # Failed segments are recorded with their status so the next build retries them
+        save_manifest(MANIFEST_FILE, inputs, settings, {
+            segment["segment_id"]: {"hash": segment_hashes[segment["segment_id"]], "status": segment.get("status")}
+            for segment in metadata["segments"]
+        })
+
+def main(args):
+    """Runs the pipeline, then logs stage timings and counters and optionally writes a trace."""
+    try:
+        with profiler.span("pipeline", category="run"):
+            translate = make_backend(args.backend, args.fake_latency, args.backend_url, args.backend_model)
+            run_pipeline(args, translate)
+    finally:
+        summary = profiler.summary()
+        stages = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in summary["stages"].items())
+        logging.info(f"Stage timings: {stages}")
+        logging.info(f"Counters: {summary['counters']}; peak RSS {summary['peak_rss_bytes'] / 2**20:.1f} MiB")
+        if args.profile:
+            profiler.write_trace(args.profile)
+            logging.info(f"Profile trace written to {args.profile}")
+
+def build_parser():
+    """Builds the command-line parser; main and run_pipeline take the namespace it parses."""
+    parser = argparse.ArgumentParser(description="Preprocess a C file or project and translate it to Rust.")
+    parser.add_argument("input", nargs="?", default="main.c",
+                        help="C file, project directory or compile_commands.json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of segments translated concurrently")
+    parser.add_argument("--requests-per-second", type=float, default=None,
+                        help="rate limit for translator requests")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help="retries per segment before giving up")
+    parser.add_argument("--backend", choices=BACKENDS, default="gemini",
+                        help="translator backend: remote Gemini, a local OpenAI-compatible HTTP server, or the offline mock")
+    parser.add_argument("--backend-url", default=None,
+                        help=f"chat completions endpoint of the http backend (default: {DEFAULT_HTTP_URL})")
+    parser.add_argument("--backend-model", default=None,
+                        help="model name sent to the backend")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="maximum segments per translation request (default: the backend's limit)")
+    parser.add_argument("--batch-tokens", type=int, default=None,
+                        help="maximum estimated tokens of C code per translation request")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="use the offline mock backend with this latency (seconds) per request")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always call the translator, bypassing the translation cache")
+    parser.add_argument("--no-parse-cache", action="store_true",
+                        help="always parse with libclang, bypassing the persistent symbol table cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="directory holding the persistent translation and parse caches")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip unchanged translation units and only retranslate segments whose source changed")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"continue an interrupted run: reuse segments completed in {JOURNAL_FILE}, retry the rest")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="processes used for the front end in project mode (default: all cores)")
+    parser.add_argument("--keep-intermediates", action="store_true",
+                        help="write merged_<name>.c and preprocessed.c for debugging")
+    parser.add_argument("--pack-tokens", type=int, default=None,
+                        help="pack small independent symbols into one translation request up to this many tokens")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_FILE, default=None,
+                        help=f"write a Chrome trace timeline with stage/segment spans (default path: {PROFILE_FILE})")
+    parser.add_argument("--cprofile", action="store_true",
+                        help=f"dump cProfile stats of symbol extraction to {CPROFILE_FILE} in each unit's output directory")
+    return parser
 
 if __name__ == "__main__":
-    input_file = "main.c"
-    main(input_file)
+    main(build_parser().parse_args())
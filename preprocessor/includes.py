@@ -0,0 +1,187 @@
+import os
+import re
+
+USER_INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*"(.+?)"')
+SYSTEM_INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*<.+?>')
+PRAGMA_ONCE_PATTERN = re.compile(r'^\s*#\s*pragma\s+once\b')
+IF_PATTERN = re.compile(r'^\s*#\s*if')
+IFNDEF_PATTERN = re.compile(r'^\s*#\s*ifndef\s+(\w+)')
+DEFINE_PATTERN = re.compile(r'^\s*#\s*define\s+(\w+)')
+ENDIF_PATTERN = re.compile(r'^\s*#\s*endif\b')
+
+# Line kinds in a tokenized header
+TEXT, USER_INCLUDE, SYSTEM_INCLUDE, PRAGMA_ONCE = range(4)
+
+# Parsed headers shared by every resolver in this process, keyed by path and validated by mtime
+_header_cache = {}
+
+class ParsedHeader:
+    """A source file split into tokenized lines, with its include-guard status."""
+    __slots__ = ("path", "mtime", "lines", "once")
+
+    def __init__(self, path, mtime, lines, once):
+        self.path = path
+        self.mtime = mtime
+        self.lines = lines
+        self.once = once
+
+def is_guarded(lines):
+    """Detects a classic #ifndef X / #define X ... #endif guard wrapping the whole file."""
+    significant = [text for kind, text in lines if kind != TEXT or text.strip()]
+    if len(significant) < 3:
+        return False
+    guard = IFNDEF_PATTERN.match(significant[0])
+    define = DEFINE_PATTERN.match(significant[1])
+    if not guard or not define or guard.group(1) != define.group(1):
+        return False
+    if not ENDIF_PATTERN.match(significant[-1]):
+        return False
+
+    # The final #endif must close the guard's #if, not a later conditional
+    depth = 0
+    for text in significant[:-1]:
+        if IF_PATTERN.match(text):
+            depth += 1
+        elif ENDIF_PATTERN.match(text):
+            depth -= 1
+            if depth == 0:
+                return False
+    return depth == 1
+
+def tokenize(text):
+    """Splits source text into (kind, payload) lines; include lines carry the included name."""
+    lines = []
+    once = False
+    for line in text.splitlines(keepends=True):
+        user_match = USER_INCLUDE_PATTERN.match(line)
+        if user_match:
+            lines.append((USER_INCLUDE, user_match.group(1)))
+        elif SYSTEM_INCLUDE_PATTERN.match(line):
+            lines.append((SYSTEM_INCLUDE, line))
+        elif PRAGMA_ONCE_PATTERN.match(line):
+            lines.append((PRAGMA_ONCE, line))
+            once = True
+        else:
+            lines.append((TEXT, line))
+    if lines and lines[-1][0] == TEXT and not lines[-1][1].endswith("\n"):
+        lines[-1] = (TEXT, lines[-1][1] + "\n")
+    return lines, once
+
+def parse_header(path, mtime):
+    """Returns the tokenized header at path, reusing the cached copy while its mtime is unchanged."""
+    cached = _header_cache.get(path)
+    if cached is not None and cached.mtime == mtime:
+        return cached
+
+    with open(path, "r") as f:
+        lines, once = tokenize(f.read())
+    header = ParsedHeader(path, mtime, lines, once or is_guarded(lines))
+    _header_cache[path] = header
+    return header
+
+def line_directive(line, path):
+    """Returns a #line directive stating that the next line is `line` of `path`."""
+    escaped = path.replace("\\", "\\\\").replace('"', '\\"')
+    return f'#line {line} "{escaped}"\n'
+
+class IncludeResolver:
+    """Resolves and merges user includes, honouring -I search paths and include guards.
+
+    Each resolver stats a file at most once; parsed headers are shared across
+    resolvers through a process-wide cache. `graph` maps every visited file
+    to the files it includes, in order.
+    """
+
+    def __init__(self, include_dirs=()):
+        self.include_dirs = [os.path.abspath(d) for d in include_dirs]
+        self.graph = {}
+        self.mtimes = {}
+        self.resolved = {}
+
+    def mtime(self, path):
+        """Returns the file's mtime, or None if it does not exist; cached for the resolver's lifetime."""
+        if path not in self.mtimes:
+            try:
+                self.mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                self.mtimes[path] = None
+        return self.mtimes[path]
+
+    def resolve(self, name, including_file):
+        """Finds a quoted include next to the including file first, then in the -I directories."""
+        directory = os.path.dirname(including_file)
+        key = (directory, name)
+        if key not in self.resolved:
+            self.resolved[key] = None
+            for base in [directory] + self.include_dirs:
+                candidate = os.path.normpath(os.path.join(base, name))
+                if self.mtime(candidate) is not None:
+                    self.resolved[key] = candidate
+                    break
+        return self.resolved[key]
+
+    def parse(self, path):
+        """Parses a file and records its direct includes in the include graph."""
+        header = parse_header(path, self.mtime(path))
+        if path not in self.graph:
+            includes = []
+            for kind, payload in header.lines:
+                if kind == USER_INCLUDE:
+                    include_path = self.resolve(payload, path)
+                    if include_path is not None:
+                        includes.append(include_path)
+            self.graph[path] = includes
+        return header
+
+    def merge(self, file):
+        """Inlines user includes into file, dropping every #include directive.
+
+        Headers with include guards or #pragma once are inlined once; other
+        headers are inlined at every include site unless that would recurse.
+        #line directives mark where each file's text starts and resumes, so
+        the preprocessor's linemarkers keep the real file and line of every
+        symbol.
+        """
+        output = []
+        included_once = set()
+        active = set()
+
+        def merge_file(path):
+            header = self.parse(path)
+            if header.once:
+                if path in included_once:
+                    return
+                included_once.add(path)
+            active.add(path)
+            output.append(line_directive(1, path))
+            for number, (kind, payload) in enumerate(header.lines, 1):
+                if kind == TEXT:
+                    output.append(payload)
+                    continue
+                include_path = self.resolve(payload, path) if kind == USER_INCLUDE else None
+                if include_path is not None and include_path not in active:
+                    merge_file(include_path)
+                    output.append(line_directive(number + 1, path))
+                else:
+                    # Dropped directives leave a blank line so later lines keep their numbers
+                    output.append("\n")
+            active.discard(path)
+
+        merge_file(os.path.abspath(file))
+        return "".join(output)
+
+    def includes(self, file):
+        """Returns every header reachable from file, in first-visit order."""
+        root = os.path.abspath(file)
+        headers = []
+        seen = {root}
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            self.parse(path)
+            for include_path in reversed(self.graph[path]):
+                if include_path not in seen:
+                    seen.add(include_path)
+                    headers.append(include_path)
+                    stack.append(include_path)
+        return headers
@@ -0,0 +1,100 @@
+import os
+import json
+import hashlib
+from translator.journal import TRANSLATED
+
+MANIFEST_VERSION = 2
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path):
+    """Returns the SHA-256 of a file's contents."""
+    with open(path, "rb") as f:
+        return hash_bytes(f.read())
+
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "inputs": {}, "settings": {}, "segments": {}}
+
+def load_manifest(manifest_file):
+    """Loads the build manifest, returning an empty one if it is missing or stale."""
+    try:
+        with open(manifest_file, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty_manifest()
+    if manifest.get("version") != MANIFEST_VERSION:
+        return empty_manifest()
+    return manifest
+
+def save_manifest(manifest_file, inputs, settings, segments):
+    """Writes the input fingerprints, translation settings and per-segment hash and status of a build.
+
+    `settings` holds everything besides the inputs that shapes the Rust
+    output (the translator's cache namespace and the packing budget), and
+    `segments` maps each segment id to {"hash": ..., "status": ...}.
+    """
+    manifest = {"version": MANIFEST_VERSION, "inputs": inputs, "settings": settings, "segments": segments}
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+def is_up_to_date(manifest, inputs, settings):
+    """Tells whether a previous build translated every segment of these exact inputs with these settings."""
+    return (manifest["settings"] == settings and not changed_inputs(manifest["inputs"], inputs)
+            and bool(manifest["segments"])
+            and all(entry["status"] == TRANSLATED for entry in manifest["segments"].values()))
+
+def fingerprint_inputs(paths, previous=None):
+    """Fingerprints input files by mtime, size and content hash.
+
+    Hashes recorded in `previous` are reused when mtime and size are unchanged,
+    so an untouched tree costs one stat per file.
+    """
+    previous = previous or {}
+    fingerprints = {}
+    for path in paths:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        old = previous.get(path)
+        if old and old["mtime"] == stat.st_mtime and old["size"] == stat.st_size:
+            fingerprints[path] = old
+        else:
+            fingerprints[path] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": hash_file(path)}
+    return fingerprints
+
+def changed_inputs(previous, current):
+    """Returns the inputs that were added, removed or whose content changed."""
+    changed = [path for path, fp in current.items()
+               if path not in previous or previous[path]["sha256"] != fp["sha256"]]
+    changed.extend(path for path in previous if path not in current)
+    return changed
+
+def fingerprint_unit(unit, input_files, inputs):
+    """Combines the content hashes of a unit's source and headers with its compile flags.
+
+    `input_files` lists the unit's source followed by the user headers it
+    includes, and `inputs` holds their fingerprints from fingerprint_inputs.
+    """
+    digest = hashlib.sha256()
+    for path in input_files:
+        digest.update(f"{path}\0{inputs[os.path.abspath(path)]['sha256']}\0".encode())
+    digest.update("\0".join(unit["include_dirs"] + unit["defines"]).encode())
+    return digest.hexdigest()
+
+def hash_segments(segments, store):
+    """Hashes the source of every metadata segment, keyed by segment id."""
+    return {segment["segment_id"]: hash_bytes(store.read_bytes(segment["spans"])) for segment in segments}
+
+def dirty_segments(segment_hashes, previous_segments, rust_dir):
+    """Finds segments that must be retranslated: their source changed, is new, failed last time or has no Rust output.
+
+    Dependents of a changed segment are left alone; their prompt holds only
+    their own C code, so retranslating them would produce the same Rust.
+    """
+    dirty = set()
+    for segment_id, digest in segment_hashes.items():
+        previous = previous_segments.get(segment_id)
+        if previous is None or previous["hash"] != digest or previous["status"] != TRANSLATED \
+                or not os.path.exists(os.path.join(rust_dir, f"{segment_id}.rs")):
+            dirty.add(segment_id)
+    return dirty
@@ -0,0 +1,68 @@
+import time
+import sqlite3
+import threading
+
+class LRUStore:
+    """Persistent SQLite key-value table with size-bounded LRU eviction.
+
+    Safe to share between threads and between processes: every process
+    opens its own connection and SQLite serializes the writers, so the
+    total size is re-read from the table rather than tracked in memory.
+    """
+
+    def __init__(self, path, table, max_bytes):
+        self.path = path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_used ON {table}(last_used)")
+        self.conn.commit()
+
+    def get(self, key):
+        """Returns the stored value for key and marks it as recently used, or None on a miss."""
+        with self.lock:
+            row = self.conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key, value, size):
+        """Stores a value of `size` bytes and evicts least recently used entries beyond max_bytes."""
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.total_bytes()
+        while total > self.max_bytes:
+            rows = self.conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def total_bytes(self):
+        return self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -1,37 +1,105 @@
 import os
 import json
 import networkx as nx
+from preprocessor.segmentation import build_dependency_graph
 
-def generate_metadata(symbols, segment_files, output_dir="output"):
-    """Generates metadata linking segments with extracted symbols."""
+# Rough size of a model token in bytes of C source, used for packing small segments
+BYTES_PER_TOKEN = 4
+
+def segment_size(spans):
+    return sum(length for _, _, length in spans)
+
+def condense(graph, by_id):
+    """Collapses strongly connected components into single multi-symbol nodes.
+
+    Each node of the returned DAG carries its member symbols in source order.
+    """
+    order = {segment_id: index for index, segment_id in enumerate(by_id)}
+    condensed = nx.condensation(graph)
+    for node, data in condensed.nodes(data=True):
+        members = sorted(data["members"], key=order.__getitem__)
+        data["symbols"] = [by_id[segment_id] for segment_id in members]
+        data["order"] = order[members[0]]
+    return condensed
+
+def levelize(condensed):
+    """Groups condensed nodes into levels: a node's level is one more than its deepest dependency."""
+    levels = {}
+    for node in reversed(list(nx.topological_sort(condensed))):
+        levels[node] = 1 + max((levels[dep] for dep in condensed.successors(node)), default=-1)
+    batches = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for node in sorted(levels, key=lambda node: condensed.nodes[node]["order"]):
+        batches[levels[node]].append(node)
+    return batches
+
+def pack_leaves(condensed, batch, token_budget):
+    """Packs small independent leaf nodes of a batch into groups that fit one request."""
+    groups = []
+    current, current_tokens = [], 0
+    for node in batch:
+        symbols = condensed.nodes[node]["symbols"]
+        tokens = sum(segment_size(symbol.spans) for symbol in symbols) // BYTES_PER_TOKEN
+        is_leaf = condensed.out_degree(node) == 0
+        if not is_leaf or tokens >= token_budget:
+            groups.append([node])
+            continue
+        if current and current_tokens + tokens > token_budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(node)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+def generate_metadata(symbols, graph=None, output_dir="output", token_budget=None):
+    """Generates metadata linking segments with extracted symbols.
+
+    Mutually dependent symbols (cycles) are condensed into one segment listing
+    all of them in `contained_symbols`. Segments are emitted level by level,
+    dependencies first, and `batches` lists the segment ids of each level; all
+    segments in a batch are independent of each other. With a `token_budget`,
+    small leaf symbols are packed together into one segment per request.
+    """
     os.makedirs(output_dir, exist_ok=True)
-    metadata = {"segments": []}
-
-    # Build dependency graph
-    graph = nx.DiGraph()
-    for symbol in symbols:
-        graph.add_node(symbol["name"])
-        for dependency in symbol["dependencies"]:
-            graph.add_edge(symbol["name"], dependency)
-
-    # Topological sorting (ensuring dependency order)
-    try:
-        sorted_symbols = list(nx.topological_sort(graph))
-    except nx.NetworkXUnfeasible:
-        raise ValueError("Dependency graph contains cycles!")
-
-    for name in sorted_symbols:
-        if name in segment_files:
+    metadata = {"segments": [], "batches": []}
+
+    graph = graph if graph is not None else build_dependency_graph(symbols)
+    by_id = {symbol.segment_id: symbol for symbol in symbols if symbol.segment_id is not None}
+    condensed = condense(graph, by_id)
+
+    for batch in levelize(condensed):
+        groups = pack_leaves(condensed, batch, token_budget) if token_budget else [[node] for node in batch]
+        batch_ids = []
+        for group in groups:
+            members = [symbol for node in group for symbol in condensed.nodes[node]["symbols"]]
+            segment_id = members[0].segment_id
+            if len(group) > 1:
+                segment_id = f"{segment_id}__pack"
+            elif len(members) > 1:
+                segment_id = f"{segment_id}__cycle"
+            for node in group:
+                condensed.nodes[node]["segment_id"] = segment_id
+
+            dependencies = []
+            for node in group:
+                for dep in condensed.successors(node):
+                    dep_id = condensed.nodes[dep]["segment_id"]
+                    if dep_id not in dependencies:
+                        dependencies.append(dep_id)
+
             metadata["segments"].append({
-                "segment_id": name,
-                "file": segment_files[name],
-                "rust_file": f"{name}.rs",
-                "contained_symbols": [name],
-                "dependencies": list(graph.successors(name))
+                "segment_id": segment_id,
+                "spans": [span for symbol in members for span in symbol.spans],
+                "rust_file": f"{segment_id}.rs",
+                "contained_symbols": [symbol.name for symbol in members],
+                "dependencies": dependencies
             })
+            batch_ids.append(segment_id)
+        metadata["batches"].append(batch_ids)
 
     metadata_file = os.path.join(output_dir, "metadata.json")
     with open(metadata_file, "w") as f:
         json.dump(metadata, f, indent=4)
-    
+
     return metadata_file
@@ -0,0 +1,116 @@
+import os
+import struct
+import hashlib
+from preprocessor.segmentation import Symbol, PARSE_OPTIONS, extract_symbols
+from preprocessor.lru_store import LRUStore
+
+PARSE_CACHE_FILE = "symbols.sqlite"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Bump when extraction changes so stale symbol tables are never reused
+FORMAT_VERSION = 4
+MAGIC = b"SYMT"
+HEADER = struct.Struct("<4sHII")  # magic, version, symbol count, string table size
+RECORD = struct.Struct("<IIIIIIIII")  # name, kind, start/end line, start/end offset, origin, origin line, dependency count
+NO_ORIGIN = 0xFFFFFFFF
+
+def source_key(source):
+    """Hashes preprocessed source together with the extractor version and parse options."""
+    digest = hashlib.sha256()
+    digest.update(f"{FORMAT_VERSION}:{PARSE_OPTIONS}".encode())
+    digest.update(b"\0")
+    digest.update(source)
+    return digest.hexdigest()
+
+def encode_symbols(symbols):
+    """Packs a symbol table into bytes: a header, a NUL-separated string table and fixed-size records.
+
+    Names, kinds and dependencies are stored once in the string table and
+    referenced by index, so the repeated dependency names cost 4 bytes each.
+    """
+    strings = {}
+
+    def intern(text):
+        return strings.setdefault(text, len(strings))
+
+    records = []
+    for symbol in symbols:
+        origin = NO_ORIGIN if symbol.origin is None else intern(symbol.origin)
+        records.append(RECORD.pack(intern(symbol.name), intern(symbol.kind), symbol.start_line, symbol.end_line,
+                                   symbol.start_offset, symbol.end_offset, origin, symbol.origin_line,
+                                   len(symbol.dependencies)))
+        records.append(struct.pack(f"<{len(symbol.dependencies)}I", *map(intern, symbol.dependencies)))
+    table = "\0".join(strings).encode()
+    return HEADER.pack(MAGIC, FORMAT_VERSION, len(symbols), len(table)) + table + b"".join(records)
+
+def decode_symbols(data):
+    """Rebuilds the symbols packed by encode_symbols; raises ValueError for foreign or outdated data."""
+    magic, version, count, table_size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Unsupported symbol table format")
+    offset = HEADER.size
+    strings = data[offset:offset + table_size].decode().split("\0")
+    offset += table_size
+
+    symbols = []
+    for _ in range(count):
+        (name, kind, start_line, end_line, start_offset, end_offset,
+         origin, origin_line, dep_count) = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        symbol = Symbol(strings[name], strings[kind], start_line, end_line, start_offset, end_offset)
+        symbol.origin = None if origin == NO_ORIGIN else strings[origin]
+        symbol.origin_line = origin_line
+        symbol.dependencies = [strings[i] for i in struct.unpack_from(f"<{dep_count}I", data, offset)]
+        offset += 4 * dep_count
+        symbols.append(symbol)
+    return symbols
+
+class ParseCache(LRUStore):
+    """Persistent SQLite cache of extracted symbol tables keyed by preprocessed content, with LRU eviction.
+
+    Safe to share between the processes of a project run: every process
+    opens its own connection and SQLite serializes the writers.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        super().__init__(os.path.join(cache_dir, PARSE_CACHE_FILE), "symbol_tables", max_bytes)
+
+    def get(self, key):
+        """Returns the cached symbols for key, or None on a miss."""
+        value = super().get(key)
+        if value is None:
+            return None
+        try:
+            return decode_symbols(value)
+        except (ValueError, struct.error, UnicodeDecodeError):
+            return None
+
+    def put(self, key, symbols):
+        """Stores a symbol table and evicts least recently used tables beyond max_bytes."""
+        value = encode_symbols(symbols)
+        super().put(key, value, len(value))
+
+# Opened once per process and cache directory, so pool workers keep their connection across units
+_parse_caches = {}
+
+def get_parse_cache(cache_dir):
+    if cache_dir not in _parse_caches:
+        _parse_caches[cache_dir] = ParseCache(cache_dir)
+    return _parse_caches[cache_dir]
+
+def extract_symbols_cached(file, source, cache_dir=None):
+    """Returns the symbols of a preprocessed buffer from the parse cache, extracting and storing them on a miss.
+
+    Returns (symbols, hit). Without a `cache_dir` the symbols are always extracted.
+    """
+    if cache_dir is None:
+        return extract_symbols(file, source=source), False
+    cache = get_parse_cache(cache_dir)
+    key = source_key(source)
+    symbols = cache.get(key)
+    if symbols is not None:
+        return symbols, True
+    symbols = extract_symbols(file, source=source)
+    cache.put(key, symbols)
+    return symbols, False
@@ -1,85 +1,62 @@
 import os
-import re
-import uuid
 import subprocess
+from preprocessor.includes import IncludeResolver
 
-def extract_user_defined_includes(file):
+def extract_user_defined_includes(file, include_dirs=()):
     """Extracts user-defined includes, ignoring system headers."""
-    include_pattern = re.compile(r'^\s*#include\s*"(.+?)"', re.MULTILINE)
-    includes = []
-    base_dir = os.path.dirname(os.path.abspath(file))
+    resolver = IncludeResolver(include_dirs)
+    path = os.path.abspath(file)
+    resolver.parse(path)
+    return resolver.graph[path]
 
-    with open(file, "r") as f:
-        content = f.read()
-        for match in include_pattern.finditer(content):
-            include_path = os.path.join(base_dir, match.group(1))
-            if os.path.exists(include_path):
-                includes.append(include_path)
-    return includes
+def collect_user_includes(file, include_dirs=()):
+    """Returns every user header reachable from file through #include "..." directives."""
+    return IncludeResolver(include_dirs).includes(file)
 
-def merge_user_includes(file):
+def merge_user_includes(file, include_dirs=()):
     """Recursively merges user-defined includes into the main file while avoiding all #include directives."""
-    processed = set()
+    return IncludeResolver(include_dirs).merge(file)
 
-    def merge(file_path):
-        if file_path in processed:
-            return ""  # Avoid circular includes
-        processed.add(file_path)
-
-        with open(file_path, "r") as f:
-            content = f.readlines()
-
-        merged_content = []
-        user_include_pattern = re.compile(r'^\s*#include\s*"(.+?)"')
-        system_include_pattern = re.compile(r'^\s*#include\s*<.+?>')
-
-        for line in content:
-            # Handle user includes
-            user_match = user_include_pattern.match(line)
-            if user_match:
-                include_file = user_match.group(1)
-                include_path = os.path.join(os.path.dirname(file_path), include_file)
-                if os.path.exists(include_path):
-                    merged_content.append(merge(include_path))
-                continue
-            
-            # Skip system includes
-            if system_include_pattern.match(line):
-                continue
-            
-            # Add all other lines
-            merged_content.append(line)
-
-        return "".join(merged_content)
-
-    return merge(file)
-
-def preprocess_c_file(input_file, output_dir="output"):
-    """Preprocesses the C file by merging user-defined includes, expanding macros, and removing all includes."""
-    os.makedirs(output_dir, exist_ok=True)
-    merged_file_path = os.path.join(output_dir, f"merged_{os.path.basename(input_file)}")
-
-    # Merge user-defined includes and remove all #include directives
-    merged_content = merge_user_includes(input_file)
-    with open(merged_file_path, "w") as f:
-        f.write(merged_content)
-
-    # Expand macros using GCC preprocessor while ignoring system includes
-    preprocessed_file = os.path.join(output_dir, "preprocessed.c")
+def run_gcc_preprocessor(merged_content, include_dirs=(), defines=()):
+    """Expands macros by piping merged source through gcc's preprocessor; returns the output bytes."""
     cmd = [
         "gcc", 
         "-nostdinc",       # Prevent standard system includes
         "-ffreestanding",  # Disable standard library assumptions
         "-E",              # Run preprocessor
         "-dD",             # Output macro definitions
-        merged_file_path, 
-        "-o", preprocessed_file,
+        *[f"-I{include_dir}" for include_dir in include_dirs],
+        *defines,          # -D/-U flags, e.g. from compile_commands.json
+        "-x", "c", "-",    # Read C source from stdin; output goes to stdout
         "-std=c99"
     ]
-    
+
     try:
-        subprocess.run(cmd, check=True, stderr=subprocess.PIPE)
+        result = subprocess.run(cmd, input=merged_content.encode(), check=True,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
         raise RuntimeError(f"Preprocessing failed:\nCommand: {e.cmd}\nError: {e.stderr.decode()}")
 
-    return preprocessed_file
\ No newline at end of file
+    return result.stdout
+
+def preprocess_source(input_file, include_dirs=(), defines=()):
+    """Merges user includes and expands macros entirely in memory; returns (merged, preprocessed)."""
+    merged_content = merge_user_includes(input_file, include_dirs)
+    return merged_content, run_gcc_preprocessor(merged_content, include_dirs, defines)
+
+def write_intermediates(input_file, merged_content, preprocessed, output_dir="output"):
+    """Writes merged_<name>.c and preprocessed.c for debugging; returns the preprocessed path."""
+    os.makedirs(output_dir, exist_ok=True)
+    merged_file_path = os.path.join(output_dir, f"merged_{os.path.basename(input_file)}")
+    with open(merged_file_path, "w") as f:
+        f.write(merged_content)
+
+    preprocessed_file = os.path.join(output_dir, "preprocessed.c")
+    with open(preprocessed_file, "wb") as f:
+        f.write(preprocessed)
+    return preprocessed_file
+
+def preprocess_c_file(input_file, output_dir="output", include_dirs=(), defines=()):
+    """Preprocesses the C file by merging user-defined includes, expanding macros, and removing all includes."""
+    merged_content, preprocessed = preprocess_source(input_file, include_dirs, defines)
+    return write_intermediates(input_file, merged_content, preprocessed, output_dir)
@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import resource
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+class Profiler:
+    """Collects timing spans and counters for a pipeline run.
+
+    Spans are recorded as Chrome trace "complete" events (timestamps in
+    microseconds of wall-clock time) so events from worker processes can be
+    merged into the same timeline.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category="stage", **args):
+        """Times the enclosed block; `args` are attached to the trace event and may be updated inside it."""
+        start = time.time_ns() // 1000
+        try:
+            yield args
+        finally:
+            event = {
+                "name": name, "cat": category, "ph": "X", "ts": start,
+                "dur": time.time_ns() // 1000 - start,
+                "pid": os.getpid(), "tid": threading.get_ident(), "args": args,
+            }
+            with self.lock:
+                self.events.append(event)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def drain(self):
+        """Returns and clears the recorded events and counters, e.g. to ship them from a worker."""
+        with self.lock:
+            events, counters = self.events, self.counters
+            self.events, self.counters = [], Counter()
+        return events, counters
+
+    def merge(self, events, counters):
+        """Adds events and counters recorded by another profiler, typically in a worker process."""
+        with self.lock:
+            self.events.extend(events)
+            self.counters.update(counters)
+
+    def summary(self):
+        """Totals time per stage, adds counters and the peak resident set size of this run."""
+        stages = defaultdict(float)
+        segments = []
+        for event in self.events:
+            if event["cat"] == "stage":
+                stages[event["name"]] += event["dur"] / 1e6
+            elif event["cat"] == "segment":
+                segments.append(event["dur"] / 1e6)
+        return {
+            "stages": {name: round(seconds, 6) for name, seconds in stages.items()},
+            "segment_translation": {
+                "count": len(segments),
+                "total_seconds": round(sum(segments), 6),
+                "max_seconds": round(max(segments, default=0.0), 6),
+            },
+            "counters": dict(self.counters),
+            "peak_rss_bytes": peak_rss(),
+        }
+
+    def write_trace(self, path):
+        """Writes a Chrome trace (chrome://tracing, Perfetto) with the summary attached."""
+        with self.lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms", "summary": self.summary()}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+def peak_rss():
+    """Returns the peak RSS in bytes of this process or of its largest child (gcc, pool workers)."""
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * scale
+
+@contextmanager
+def cprofile_to(path):
+    """Runs the enclosed block under cProfile and dumps the stats to path; a no-op when path is None."""
+    if path is None:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(path)
+
+# Process-wide profiler used by every pipeline stage
+profiler = Profiler()
@@ -0,0 +1,187 @@
+import os
+import json
+import shlex
+import hashlib
+import struct
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from preprocessor.preprocess import preprocess_source, write_intermediates
+from preprocessor.segmentation import segment_code, load_segments
+from preprocessor.parse_cache import extract_symbols_cached, encode_symbols, decode_symbols
+from preprocessor.profiling import profiler, cprofile_to
+
+UNITS_DIR = "units"
+SOURCE_EXTENSIONS = (".c",)
+CPROFILE_FILE = "extract_symbols.prof"
+UNIT_SYMBOLS_FILE = "symbols.bin"
+
+def parse_compile_command(entry):
+    """Extracts the source file, include directories and macro definitions from a compile_commands.json entry."""
+    directory = entry.get("directory", ".")
+    args = entry["arguments"] if "arguments" in entry else shlex.split(entry["command"])
+    include_dirs, defines = [], []
+
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("-I", "-D", "-U") and i + 1 < len(args):
+            arg, i = arg + args[i + 1], i + 1
+        if arg.startswith("-I"):
+            include_dirs.append(os.path.normpath(os.path.join(directory, arg[2:])))
+        elif arg.startswith(("-D", "-U")):
+            defines.append(arg)
+        i += 1
+
+    return {
+        "source": os.path.normpath(os.path.join(directory, entry["file"])),
+        "include_dirs": include_dirs,
+        "defines": defines,
+    }
+
+def discover_units(path):
+    """Lists the translation units of a project directory or compile_commands.json file."""
+    if os.path.isfile(path) and os.path.basename(path) == "compile_commands.json":
+        with open(path, "r") as f:
+            entries = json.load(f)
+        units = []
+        seen = set()
+        for unit in map(parse_compile_command, entries):
+            if not unit["source"].endswith(SOURCE_EXTENSIONS):
+                continue
+            key = (unit["source"], tuple(unit["include_dirs"]), tuple(unit["defines"]))
+            if key in seen:
+                logging.warning(f"Skipping duplicate compile command for {unit['source']}")
+                continue
+            seen.add(key)
+            units.append(unit)
+        return units
+
+    units = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.endswith(SOURCE_EXTENSIONS):
+                units.append({"source": os.path.join(root, name), "include_dirs": [], "defines": []})
+    return units
+
+def unit_name(source, root):
+    """Derives a unique, filesystem-safe output namespace for a translation unit."""
+    relative = os.path.relpath(os.path.abspath(source), root)
+    return os.path.splitext(relative)[0].replace(os.sep, "__")
+
+def unit_names(units, root):
+    """Names every unit after its source; a source compiled with several flag sets gets a hash of its flags too."""
+    names = [unit_name(unit["source"], root) for unit in units]
+    counts = Counter(names)
+    for index, unit in enumerate(units):
+        if counts[names[index]] > 1:
+            flags = "\0".join(unit["include_dirs"] + unit["defines"])
+            names[index] += "__" + hashlib.sha256(flags.encode()).hexdigest()[:8]
+    return names
+
+def process_unit(unit):
+    """Preprocesses, parses and segments one translation unit inside its own output directory.
+
+    The preprocessed source stays in memory; merged_<name>.c and
+    preprocessed.c are only written when the unit asks to keep intermediates.
+    With a `parse_cache_dir`, unchanged preprocessed sources reuse their
+    symbol table from the persistent parse cache instead of being parsed.
+    """
+    with profiler.span("preprocess", unit=unit["name"]):
+        merged_content, source = preprocess_source(unit["source"], unit["include_dirs"], unit["defines"])
+        preprocessed_file = os.path.join(unit["output_dir"], "preprocessed.c")
+        if unit.get("keep_intermediates"):
+            write_intermediates(unit["source"], merged_content, source, unit["output_dir"])
+    profiler.count("units")
+    profiler.count("preprocessed_bytes", len(source))
+
+    cprofile_path = os.path.join(unit["output_dir"], CPROFILE_FILE) if unit.get("cprofile") else None
+    with profiler.span("extract_symbols", unit=unit["name"]) as args, cprofile_to(cprofile_path):
+        symbols, hit = extract_symbols_cached(preprocessed_file, source, unit.get("parse_cache_dir"))
+        args["cached"] = hit
+    if unit.get("parse_cache_dir"):
+        profiler.count("parse_cache_hits" if hit else "parse_cache_misses")
+    for symbol in symbols:
+        symbol.unit = unit["name"]
+    profiler.count("symbols", len(symbols))
+
+    with profiler.span("segment_code", unit=unit["name"]):
+        segmented = segment_code(preprocessed_file, symbols, output_dir=unit["output_dir"], source=source)
+    if unit.get("fingerprint"):
+        save_unit(unit, segmented)
+    return unit["name"], symbols, segmented
+
+def save_unit(unit, segmented):
+    """Records a unit's segmented symbols next to its segment store, tagged with the unit's input fingerprint."""
+    with open(os.path.join(unit["output_dir"], UNIT_SYMBOLS_FILE), "wb") as f:
+        f.write(unit["fingerprint"].encode() + b"\n" + encode_symbols(segmented))
+
+def load_unit(unit):
+    """Returns the segmented symbols saved by an earlier run of this unit.
+
+    Returns None unless they were saved for the same input fingerprint, so
+    the unit only skips process_unit when its source, headers and flags are
+    unchanged.
+    """
+    try:
+        with open(os.path.join(unit["output_dir"], UNIT_SYMBOLS_FILE), "rb") as f:
+            fingerprint, _, data = f.read().partition(b"\n")
+        if fingerprint.decode() != unit.get("fingerprint"):
+            return None
+        symbols = load_segments(decode_symbols(data), unit["output_dir"])
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        return None
+    for symbol in symbols:
+        symbol.unit = unit["name"]
+    return symbols
+
+def process_unit_profiled(unit):
+    """Runs process_unit in a worker process and ships its profiling data back with the result."""
+    profiler.drain()  # discard anything inherited from the parent when the worker was forked
+    result = process_unit(unit)
+    return result, profiler.drain()
+
+def run_project(units, output_dir="output", max_workers=None, keep_intermediates=False, cprofile=False,
+                parse_cache_dir=None, reuse=False):
+    """Runs the front end of every unit on a process pool and merges their symbol tables.
+
+    Returns the symbols of the whole project; each symbol records its unit so
+    clashing names can be given distinct segment ids. With `reuse`, units
+    whose input fingerprint matches their saved symbols are not processed again.
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(unit["source"])) for unit in units])
+    for unit, name in zip(units, unit_names(units, root)):
+        unit["name"] = name
+        unit["output_dir"] = os.path.join(output_dir, UNITS_DIR, unit["name"])
+        unit["keep_intermediates"] = keep_intermediates
+        unit["cprofile"] = cprofile
+        unit["parse_cache_dir"] = parse_cache_dir
+
+    # Symbols are merged in unit order whether a unit is reused or processed, so segment ids stay stable
+    unit_symbols = {}
+    pending = []
+    for unit in units:
+        reused = load_unit(unit) if reuse else None
+        if reused is None:
+            pending.append(unit)
+        else:
+            profiler.count("units_reused")
+            unit_symbols[unit["name"]] = reused
+    if reuse:
+        logging.info(f"{len(units) - len(pending)} units unchanged, {len(pending)} to process")
+
+    if pending:
+        max_workers = max_workers or os.cpu_count()
+        chunksize = max(1, len(pending) // (max_workers * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(process_unit_profiled, pending, chunksize=chunksize)
+            for (name, symbols, segmented), (events, counters) in results:
+                profiler.merge(events, counters)
+                logging.info(f"Processed unit {name}: {len(segmented)} segments")
+                unit_symbols[name] = symbols
+
+    symbols = []
+    for unit in units:
+        symbols.extend(unit_symbols[unit["name"]])
+    return symbols
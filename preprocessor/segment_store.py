@@ -0,0 +1,55 @@
+import os
+import mmap
+import threading
+
+STORE_FILE = "segments.store"
+
+def write_store(path, source, ranges):
+    """Writes the given (start, end) byte ranges of source back to back into one store file.
+
+    Returns a [path, offset, length] span for every range, in order.
+    """
+    spans = []
+    offset = 0
+    with open(path, "wb") as f:
+        for start, end in ranges:
+            f.write(source[start:end])
+            spans.append([path, offset, end - start])
+            offset += end - start
+    return spans
+
+class SegmentStore:
+    """Serves segment source lazily from memory-mapped store files.
+
+    A segment is a list of [store_path, offset, length] spans; nothing is read
+    until a segment is requested, and pages are loaded on demand by the OS.
+    """
+
+    def __init__(self):
+        self.maps = {}
+        self.lock = threading.Lock()
+
+    def _map(self, path):
+        with self.lock:
+            if path not in self.maps:
+                with open(path, "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        self.maps[path] = b""
+                    else:
+                        self.maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self.maps[path]
+
+    def read_bytes(self, spans):
+        """Returns the raw bytes of a segment, concatenating its spans."""
+        return b"".join(self._map(path)[offset:offset + length] for path, offset, length in spans)
+
+    def read(self, spans):
+        """Returns the source text of a segment."""
+        return self.read_bytes(spans).decode(errors="replace")
+
+    def close(self):
+        with self.lock:
+            for mapped in self.maps.values():
+                if isinstance(mapped, mmap.mmap):
+                    mapped.close()
+            self.maps.clear()
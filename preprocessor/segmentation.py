@@ -1,71 +1,350 @@
 import os
+import re
+import hashlib
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
 import clang.cindex
 import networkx as nx
+from preprocessor.segment_store import STORE_FILE, write_store
+
+SYMBOL_KINDS = {
+    clang.cindex.CursorKind.FUNCTION_DECL,
+    clang.cindex.CursorKind.STRUCT_DECL,
+    clang.cindex.CursorKind.UNION_DECL,
+    clang.cindex.CursorKind.MACRO_DEFINITION,
+}
+RECORD_KINDS = {clang.cindex.CursorKind.STRUCT_DECL, clang.cindex.CursorKind.UNION_DECL}
+PARSE_OPTIONS = (clang.cindex.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+                 | clang.cindex.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD)
+
+# gcc linemarkers naming pseudo-files whose contents are not user code
+BUILTIN_FILES = (b'"<built-in>"', b'"<command-line>"')
+LINEMARKER_PATTERN = re.compile(rb'^# (\d+) ("[^"]*")', re.MULTILINE)
+# Characters allowed in segment ids, which are also used as file names
+UNSAFE_ID_PATTERN = re.compile(r"[^A-Za-z0-9_]+")
+# String and character literals are matched first so words inside them are not treated as references
+REFERENCE_PATTERN = re.compile(rb'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|([A-Za-z_]\w*)')
+
+class Symbol:
+    """A top-level symbol extracted from the preprocessed source."""
+    __slots__ = ("name", "kind", "start_line", "end_line", "start_offset", "end_offset",
+                 "dependencies", "unit", "segment_id", "spans", "digest", "origin", "origin_line")
+
+    def __init__(self, name, kind, start_line, end_line, start_offset, end_offset, unit=None):
+        self.name = name
+        self.kind = kind
+        self.start_line = start_line
+        self.end_line = end_line
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.dependencies = []
+        self.unit = unit
+        self.segment_id = None
+        self.spans = None
+        # SHA-256 of the segment text, set along with spans
+        self.digest = None
+        # File and line the symbol was written at, from the preprocessor's linemarkers
+        self.origin = None
+        self.origin_line = start_line
+
+    def __repr__(self):
+        return f"Symbol({self.name!r}, {self.kind}, lines {self.start_line}-{self.end_line})"
+
+def line_starts(source):
+    """Returns the byte offset at which every line of source starts."""
+    starts = array("L", [0])
+    find = source.find
+    pos = find(b"\n")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = find(b"\n", pos + 1)
+    return starts
+
+def user_line_mask(source, starts):
+    """Marks which lines come from user files rather than gcc's built-in pseudo-files."""
+    mask = bytearray(b"\x01") * (len(starts) + 1)
+    # A linemarker switches the file for every following line up to the next marker
+    markers = [(bisect_right(starts, m.start()), m.group(2) not in BUILTIN_FILES)
+               for m in LINEMARKER_PATTERN.finditer(source)]
+    for i, (line, is_user) in enumerate(markers):
+        if not is_user:
+            next_line = markers[i + 1][0] if i + 1 < len(markers) else len(mask)
+            mask[line:next_line] = bytes(next_line - line)
+    return mask
+
+def line_origins(source, starts):
+    """Lists the linemarkers of source as (line, file, file_line): the line after `line` is `file_line` of `file`."""
+    origins = []
+    for m in LINEMARKER_PATTERN.finditer(source):
+        file = m.group(2)[1:-1].replace(b"\\\\", b"\\").decode(errors="replace")
+        origins.append((bisect_right(starts, m.start()), file, int(m.group(1))))
+    return origins
+
+def find_function_body_end(source, offset):
+    """Returns the offset just past the body following a declarator, or None for a prototype.
+
+    Bodies are skipped by libclang, so the extent of a function ends at its
+    declarator; the body is located with a cheap brace match that ignores
+    braces inside string and character literals.
+    """
+    length = len(source)
+    i = offset
+    while i < length and source[i] not in b"{;":
+        i += 1
+    if i >= length or source[i] == ord(";"):
+        return None
+
+    depth = 0
+    while i < length:
+        c = source[i]
+        if c == 0x22 or c == 0x27:  # " or '
+            i += 1
+            while i < length and source[i] != c:
+                i += 2 if source[i] == 0x5C else 1  # skip escaped characters
+        elif c == 0x7B:  # {
+            depth += 1
+        elif c == 0x7D:  # }
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return None
+
+def is_unnamed(cursor):
+    """Anonymous records are spelled like "struct (unnamed at file:3:34)" by recent libclang versions."""
+    return not cursor.spelling or "(unnamed" in cursor.spelling or "(anonymous" in cursor.spelling
+
+def declared_name(cursor, next_sibling):
+    """Names a top-level symbol; an anonymous record takes the typedef or variable declared with it.
+
+    `typedef struct { ... } Point;` is named Point and `struct { ... } config;`
+    is named config, so the name stays stable when earlier code moves.
+    Returns None for an anonymous record declared on its own.
+    """
+    if not is_unnamed(cursor):
+        return cursor.spelling
+    if next_sibling is not None:
+        if next_sibling.kind == clang.cindex.CursorKind.TYPEDEF_DECL:
+            declared_type = next_sibling.underlying_typedef_type
+        elif next_sibling.kind == clang.cindex.CursorKind.VAR_DECL:
+            declared_type = next_sibling.type
+        else:
+            declared_type = None
+        if declared_type is not None and declared_type.get_declaration() == cursor:
+            return next_sibling.spelling
+    return None
+
+def read_source(file, source=None):
+    """Returns the preprocessed source as bytes, reading file only when no buffer is given."""
+    if source is None:
+        with open(file, "rb") as f:
+            source = f.read()
+    return source
+
+def extract_symbols(file, source=None):
+    """Extracts function definitions, structs, and macros from the user's code using Clang AST.
+
+    The AST is walked iteratively in a single pass with function bodies
+    skipped; dependencies come from a reference scan of each symbol's source.
+    When `source` bytes are given nothing is read from disk; either way the
+    buffer is handed to libclang as an unsaved file named `file`.
+    """
+    source = read_source(file, source)
+    starts = line_starts(source)
+    user_lines = user_line_mask(source, starts)
+    origins = line_origins(source, starts)
 
-def extract_symbols(file):
-    """Extracts function definitions, structs, and macros using Clang AST."""
     index = clang.cindex.Index.create()
-    translation_unit = index.parse(file)
+    translation_unit = index.parse(file, unsaved_files=[(file, source)], options=PARSE_OPTIONS)
+    main_file = translation_unit.spelling
+
     symbols = []
+    declared = set()
+    # Named records nested in an emitted record are part of its code; references to them resolve to it
+    aliases = {}
+    anonymous_count = 0
+    stack = [(cursor, None) for cursor in reversed(list(translation_unit.cursor.get_children()))]
+    while stack:
+        cursor, enclosing = stack.pop()
+        location = cursor.location
+        if location.file is None or location.file.name != main_file or not user_lines[location.line]:
+            continue
 
-    def traverse(cursor):
-        if cursor.kind in (
-            clang.cindex.CursorKind.FUNCTION_DECL,
-            clang.cindex.CursorKind.STRUCT_DECL,
-            clang.cindex.CursorKind.UNION_DECL,
-            clang.cindex.CursorKind.MACRO_DEFINITION,
-            
-        ):
-            symbol = {
-                "name": cursor.spelling,
-                "kind": cursor.kind.name,
-                "start_line": cursor.extent.start.line,
-                "end_line": cursor.extent.end.line,
-                "dependencies": []
-            }
-            # Extract dependencies (function calls, struct usage)
-            for child in cursor.get_children():
-                if child.kind.is_reference():
-                    symbol["dependencies"].append(child.spelling)
-            
+        kind = cursor.kind
+        if kind in SYMBOL_KINDS and enclosing is not None:
+            if not is_unnamed(cursor):
+                declared.add(cursor.spelling)
+                aliases[cursor.spelling] = enclosing.name
+        elif kind in SYMBOL_KINDS:
+            next_sibling = stack[-1][0] if stack else None
+            name = declared_name(cursor, next_sibling)
+            if name is None:
+                # Left with no name to derive from, anonymous records are numbered in source order
+                anonymous_count += 1
+                name = f"anonymous_{kind.name.split('_')[0].lower()}_{anonymous_count}"
+            declared.add(name)
+            extent = cursor.extent
+            start_offset, end_offset = extent.start.offset, extent.end.offset
+            if kind == clang.cindex.CursorKind.FUNCTION_DECL:
+                end_offset = find_function_body_end(source, end_offset)
+                if end_offset is None:
+                    continue  # prototypes carry no code to translate
+            elif kind in RECORD_KINDS and not cursor.is_definition():
+                continue
+            symbol = Symbol(name, kind.name, extent.start.line,
+                            bisect_right(starts, max(end_offset - 1, start_offset)), start_offset, end_offset)
+            # The last linemarker above the symbol names the file it was written in
+            marker = bisect_right(origins, (symbol.start_line,)) - 1
+            if marker >= 0:
+                line, symbol.origin, file_line = origins[marker]
+                symbol.origin_line = file_line + symbol.start_line - line - 1
             symbols.append(symbol)
+            if kind in RECORD_KINDS:
+                enclosing = symbols[-1]
 
-        for child in cursor.get_children():
-            traverse(child)
+        if kind in RECORD_KINDS:
+            # Nested records are the only symbols found below the top level
+            stack.extend((child, enclosing) for child in reversed(list(cursor.get_children())))
+
+    # Declarations count too: in project mode the definition may live in another unit
+    for symbol in symbols:
+        referenced = {
+            m.group(1).decode() for m in REFERENCE_PATTERN.finditer(source, symbol.start_offset, symbol.end_offset)
+            if m.group(1)
+        }
+        dependencies = {aliases.get(name, name) for name in referenced & declared}
+        dependencies.discard(symbol.name)
+        symbol.dependencies = sorted(dependencies)
 
-    traverse(translation_unit.cursor)
     return symbols
 
+def merge_shared_symbols(symbols):
+    """Collapses the copies of a header symbol that every including unit extracted into one symbol.
+
+    Copies share their origin file and line, name, kind and segment text; the
+    first is kept as a project-level symbol with no unit, so its segment is
+    translated once. Copies whose expanded text differs (a header configured
+    differently per unit) stay apart. Returns the remaining symbols, in order.
+    """
+    first = {}
+    merged = []
+    for symbol in symbols:
+        if symbol.origin is None or symbol.spans is None:
+            merged.append(symbol)
+            continue
+        key = (symbol.origin, symbol.origin_line, symbol.name, symbol.kind, symbol.digest)
+        kept = first.get(key)
+        if kept is None:
+            first[key] = symbol
+            merged.append(symbol)
+        elif kept.unit != symbol.unit:
+            kept.unit = None
+    return merged
+
+def assign_segment_ids(symbols):
+    """Gives every segmented symbol a unique, filesystem-safe segment id.
+
+    A bare name is used when it is unique; clashing names are qualified with
+    their unit (static functions in different units) and/or kind (a struct
+    and a function sharing a name), and finally with their line in their own
+    source file.
+    """
+    by_name = defaultdict(list)
+    for symbol in symbols:
+        if symbol.spans is not None:
+            by_name[symbol.name].append(symbol)
+
+    taken = set()
+    for name, group in by_name.items():
+        multi_unit = len({symbol.unit for symbol in group}) > 1
+        multi_kind = len({symbol.kind for symbol in group}) > 1
+        for symbol in group:
+            parts = [name]
+            if multi_unit and symbol.unit:
+                parts.insert(0, symbol.unit)
+            if multi_kind:
+                parts.append(symbol.kind.split("_")[0].lower())
+            base = UNSAFE_ID_PATTERN.sub("_", "__".join(parts))
+            segment_id = base
+            if segment_id in taken:
+                # The line in the symbol's own file stays put when other code or headers move
+                segment_id = f"{base}__{symbol.origin_line}"
+            copy = 1
+            while segment_id in taken:
+                copy += 1
+                segment_id = f"{base}__{symbol.origin_line}_{copy}"
+            taken.add(segment_id)
+            symbol.segment_id = segment_id
+
 def build_dependency_graph(symbols):
-    """Builds a dependency graph using function calls and struct references."""
+    """Builds a dependency graph between segments using function calls and struct references.
+
+    Nodes are segment ids. A referenced name resolves to the symbols of that
+    name in the referencing symbol's own unit, or to every unit if it has none.
+    """
+    by_name = defaultdict(list)
+    for symbol in symbols:
+        if symbol.segment_id is not None:
+            by_name[symbol.name].append(symbol)
+
     graph = nx.DiGraph()
     for symbol in symbols:
-        graph.add_node(symbol["name"])
-        for dependency in symbol["dependencies"]:
-            graph.add_edge(symbol["name"], dependency)
+        if symbol.segment_id is None:
+            continue
+        graph.add_node(symbol.segment_id)
+        for dependency in symbol.dependencies:
+            targets = by_name.get(dependency, [])
+            local = [target for target in targets if target.unit == symbol.unit]
+            for target in local or targets:
+                if target is not symbol:
+                    graph.add_edge(symbol.segment_id, target.segment_id)
     return graph
 
-def segment_code(file, symbols, output_dir="output"):
-    """Segments code based on extracted symbols and ensures coherent segments."""
+def segment_code(file, symbols, output_dir="output", source=None):
+    """Segments code based on extracted symbols and ensures coherent segments.
+
+    Segment text is written back to back into a single store file in
+    output_dir, and each segmented symbol gets its `spans` into that store.
+    Returns the segmented symbols.
+    """
     os.makedirs(output_dir, exist_ok=True)
-    with open(file, "r") as f:
-        lines = f.readlines()
+    source = memoryview(read_source(file, source))
+    starts = line_starts(source.obj)
+    line_count = len(starts) if source.nbytes and source[-1:] != b"\n" else len(starts) - 1
 
-    segments = {}
+    segmented = []
+    ranges = []
     for symbol in symbols:
-        start, end = symbol["start_line"] - 1, symbol["end_line"]
-        if start < 0 or end > len(lines):
+        start, end = symbol.start_line - 1, symbol.end_line
+        if start < 0 or end > line_count:
             continue
 
-        segment_code = "".join(lines[start:end])
-        segments[symbol["name"]] = segment_code
+        end_offset = starts[end] if end < len(starts) else source.nbytes
+        segmented.append(symbol)
+        ranges.append((starts[start], end_offset))
+
+    spans = write_store(os.path.join(output_dir, STORE_FILE), source, ranges)
+    for symbol, span, (start, end) in zip(segmented, spans, ranges):
+        symbol.spans = [span]
+        symbol.digest = hashlib.sha256(source[start:end]).hexdigest()
+    return segmented
 
-    # Save segments to files
-    segment_files = {}
-    for idx, (name, code) in enumerate(segments.items()):
-        segment_file = os.path.join(output_dir, f"segment_{idx}.c")
-        with open(segment_file, "w") as f:
-            f.write(code)
-        segment_files[name] = segment_file
+def load_segments(symbols, output_dir="output"):
+    """Restores the spans of symbols that segment_code already wrote to the store in output_dir.
 
-    return segment_files
+    The store holds the whole lines of each symbol back to back, in order, so
+    every symbol covers the next end_line - start_line + 1 lines of it.
+    """
+    path = os.path.join(output_dir, STORE_FILE)
+    with open(path, "rb") as f:
+        data = f.read()
+    starts = line_starts(data)
+    line = 0
+    for symbol in symbols:
+        start = starts[line] if line < len(starts) else len(data)
+        line += symbol.end_line - symbol.start_line + 1
+        end = starts[line] if line < len(starts) else len(data)
+        symbol.spans = [[path, start, end - start]]
+        symbol.digest = hashlib.sha256(data[start:end]).hexdigest()
+    return symbols
@@ -0,0 +1,30 @@
+from translator.backends import split_response, TranslationError, SEGMENT_MARKER
+
+def marker(index):
+    return SEGMENT_MARKER.format(index=index)
+
+def test_markers_split_across_chunks():
+    text = f"{marker(0)}\nfn a() {{}}\n{marker(1)}\nfn b() {{}}\n"
+    split = text.index("SEGMENT 1") + 3
+    chunks = [text[:split], text[split:]]
+    assert list(split_response(iter(chunks), 2)) == [(0, "fn a() {}"), (1, "fn b() {}")]
+
+def test_segments_are_yielded_as_the_next_marker_arrives():
+    consumed = []
+
+    def chunks():
+        for chunk in (f"{marker(0)}\nfn a() {{}}\n", f"{marker(1)}\n", "fn b() {}\n"):
+            consumed.append(chunk)
+            yield chunk
+
+    results = split_response(chunks(), 2)
+    assert next(results) == (0, "fn a() {}")
+    assert len(consumed) == 2
+    assert next(results) == (1, "fn b() {}")
+
+def test_missing_segments_become_errors():
+    text = f"```rust\n{marker(0)}\nfn a() {{}}\n{marker(2)}\nfn c() {{}}\n```"
+    results = dict(split_response(iter([text]), 3))
+    assert results[0] == "fn a() {}"
+    assert results[2] == "fn c() {}"
+    assert isinstance(results[1], TranslationError)
@@ -0,0 +1,31 @@
+import struct
+import pytest
+from preprocessor.segmentation import Symbol
+from preprocessor.parse_cache import encode_symbols, decode_symbols, HEADER, MAGIC, FORMAT_VERSION
+
+def make_symbols():
+    point = Symbol("Point", "STRUCT_DECL", 3, 6, 40, 90)
+    point.origin, point.origin_line = "/src/point.h", 2
+    scale = Symbol("scale", "FUNCTION_DECL", 8, 11, 100, 180)
+    scale.dependencies = ["Point", "SCALE"]
+    return [point, scale, Symbol("SCALE", "MACRO_DEFINITION", 1, 1, 0, 20)]
+
+def test_round_trip():
+    symbols = make_symbols()
+    decoded = decode_symbols(encode_symbols(symbols))
+    fields = ("name", "kind", "start_line", "end_line", "start_offset", "end_offset",
+              "dependencies", "origin", "origin_line")
+    assert [[getattr(symbol, field) for field in fields] for symbol in decoded] == \
+           [[getattr(symbol, field) for field in fields] for symbol in symbols]
+
+def test_empty_table_round_trip():
+    assert decode_symbols(encode_symbols([])) == []
+
+def test_outdated_format_is_rejected():
+    data = encode_symbols(make_symbols())
+    _, _, count, table_size = HEADER.unpack_from(data)
+    stale = HEADER.pack(MAGIC, FORMAT_VERSION - 1, count, table_size) + data[HEADER.size:]
+    with pytest.raises(ValueError):
+        decode_symbols(stale)
+    with pytest.raises((ValueError, struct.error)):
+        decode_symbols(b"not a symbol table")
@@ -0,0 +1,75 @@
+import threading
+from translator.fake import FakeTranslator
+from translator.scheduler import schedule_segments
+
+def make_segments(dependencies):
+    """Builds scheduler segments from a {segment_id: [dependency ids]} dict, in dict order."""
+    return [{"segment_id": segment_id, "spans": [["store", 0, 40]], "dependencies": deps}
+            for segment_id, deps in dependencies.items()]
+
+def adapt(backend, on_request=None):
+    """Turns a backend into the batch callable schedule_segments expects."""
+    def translate(batch):
+        if on_request is not None:
+            on_request(batch)
+        for index, result in backend.stream([f"int {segment['segment_id']};" for segment in batch]):
+            yield batch[index]["segment_id"], result
+    return translate
+
+def test_segments_start_after_their_dependencies():
+    deps = {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": []}
+    done = set()
+    lock = threading.Lock()
+    violations = []
+
+    def on_request(batch):
+        with lock:
+            for segment in batch:
+                violations.extend((segment["segment_id"], dep) for dep in deps[segment["segment_id"]]
+                                  if dep not in done)
+
+    def on_complete(segment_id, result):
+        with lock:
+            done.add(segment_id)
+
+    results = schedule_segments(make_segments(deps), adapt(FakeTranslator(latency=0.01), on_request),
+                                max_workers=4, on_complete=on_complete, batch_size=2)
+    assert violations == []
+    assert set(results) == set(deps)
+    assert results["d"] == "// int d;"
+
+def test_failed_requests_are_retried():
+    class FlakyTranslator(FakeTranslator):
+        """Fails the first request, then behaves like the fake backend."""
+
+        def stream(self, c_codes):
+            if self.calls == 0:
+                self.calls += 1
+                raise RuntimeError("transient")
+            yield from super().stream(c_codes)
+
+    backend = FlakyTranslator(latency=0)
+    results = schedule_segments(make_segments({"a": []}), adapt(backend), retries=2, backoff=0)
+    assert results == {"a": "// int a;"}
+    assert backend.calls == 2
+
+def test_segments_fail_after_exhausting_retries():
+    backend = FakeTranslator(latency=0, failure_rate=1.0)
+    completed = []
+    results = schedule_segments(make_segments({"a": [], "b": ["a"]}), adapt(backend), retries=2, backoff=0,
+                                on_complete=lambda segment_id, result: completed.append(segment_id))
+    assert isinstance(results["a"], RuntimeError)
+    # A failed dependency still releases its dependents
+    assert isinstance(results["b"], RuntimeError)
+    assert backend.calls == 6
+    assert completed == ["a", "b"]
+
+def test_dependency_cycle_is_released_in_metadata_order():
+    started = []
+    results = schedule_segments(make_segments({"a": ["b"], "b": ["a"], "c": ["a"]}),
+                                adapt(FakeTranslator(latency=0), lambda batch: started.extend(
+                                    segment["segment_id"] for segment in batch)),
+                                max_workers=1)
+    assert started[0] == "a"
+    assert set(results) == {"a", "b", "c"}
+    assert not any(isinstance(result, Exception) for result in results.values())
@@ -0,0 +1,44 @@
+import json
+from translator.writer import RustOutputWriter
+from translator.journal import TRANSLATED, FAILED
+
+def make_writer(tmp_path, segment_ids):
+    metadata = {"segments": [{"segment_id": segment_id, "rust_file": f"{segment_id}.rs"}
+                             for segment_id in segment_ids], "batches": [segment_ids]}
+    metadata_file = tmp_path / "metadata.json"
+    metadata_file.write_text(json.dumps(metadata))
+    rust_dir = tmp_path / "rust"
+    return RustOutputWriter(metadata, str(metadata_file), str(rust_dir), str(rust_dir / "output.rs"))
+
+def test_out_of_order_segments_are_streamed_in_metadata_order(tmp_path):
+    writer = make_writer(tmp_path, ["a", "b", "c", "d"])
+    writer.complete("c", "fn c() {}")
+    assert writer.position == 0
+    assert (tmp_path / "rust" / "c.rs").read_text() == "fn c() {}"
+    writer.complete("a", "fn a() {}")
+    assert writer.position == 1
+    writer.complete("b", RuntimeError("boom"))
+    assert writer.position == 3
+    writer.complete("d", "fn d() {}")
+    writer.close()
+
+    assert (tmp_path / "rust" / "output.rs").read_text() == "fn a() {}\n\nfn c() {}\n\nfn d() {}\n\n"
+    assert not (tmp_path / "rust" / "b.rs").exists()
+    metadata = json.loads((tmp_path / "metadata.json").read_text())
+    segments = {segment["segment_id"]: segment for segment in metadata["segments"]}
+    assert segments["a"]["status"] == TRANSLATED
+    assert segments["b"]["status"] == FAILED
+    assert segments["b"]["error"] == {"type": "RuntimeError", "message": "boom"}
+
+def test_close_skips_segments_that_never_completed(tmp_path):
+    writer = make_writer(tmp_path, ["a", "b", "c"])
+    writer.complete("c", "fn c() {}")
+    writer.close()
+    assert (tmp_path / "rust" / "output.rs").read_text() == "fn c() {}\n\n"
+
+def test_abort_leaves_no_output(tmp_path):
+    writer = make_writer(tmp_path, ["a"])
+    writer.complete("a", "fn a() {}")
+    writer.abort()
+    assert not (tmp_path / "rust" / "output.rs").exists()
+    assert (tmp_path / "rust" / "a.rs").exists()
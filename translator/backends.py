@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import urllib.request
+
+MODEL_NAME = "gemini-pro"
+
+PROMPT_TEMPLATE = """You are an expert programmer experienced in C and Rust conversion as per 2025 standards.
+        Please translate the following C code to safe, idiomatic Rust code.
+
+        Requirements:
+
+       Requirements:
+        1. Use proper ownership semantics
+        2. Convert pointers to Rust-safe constructs
+        3. Add proper error handling
+        4. Preserve original functionality
+        5. Do not include ANY comments or explanations
+        6. Do not expand stray function calls (segments will be merged)
+        7. Output ONLY the Rust code with no additional text
+        
+                
+        C Code:
+        {c_code}
+        
+        Rust Translation:"""
+
+# Multi-segment prompts number each segment and ask for the answers under the same markers
+SEGMENT_MARKER = "// ==== SEGMENT {index} ===="
+SEGMENT_MARKER_PATTERN = re.compile(r"^[ \t]*// ==== SEGMENT (\d+) ====[ \t]*$", re.MULTILINE)
+
+BATCH_PROMPT_TEMPLATE = """You are an expert programmer experienced in C and Rust conversion as per 2025 standards.
+        Please translate each of the {count} C code segments below to safe, idiomatic Rust code.
+
+        Requirements:
+        1. Use proper ownership semantics
+        2. Convert pointers to Rust-safe constructs
+        3. Add proper error handling
+        4. Preserve original functionality
+        5. Do not include ANY comments or explanations other than the segment marker lines
+        6. Do not expand stray function calls (segments will be merged)
+        7. Translate every segment separately, in the given order, and start each translation with the
+           exact marker line of its segment (for example "{example}")
+        8. Output ONLY the marker lines and the Rust code with no additional text
+
+        C Code:
+        {c_code}
+
+        Rust Translation:"""
+
+PROMPT_VERSION = hashlib.sha256((PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE).encode()).hexdigest()[:12]
+
+# Default request shape for backends that accept multi-segment prompts
+DEFAULT_BATCH_SEGMENTS = 8
+DEFAULT_BATCH_TOKENS = 2048
+
+DEFAULT_HTTP_URL = "http://localhost:8080/v1/chat/completions"
+DEFAULT_HTTP_MODEL = "local"
+DEFAULT_HTTP_TIMEOUT = 300
+
+class TranslationError(Exception):
+    """A backend could not produce a translation for a segment."""
+
+def build_prompt(c_codes):
+    """Builds the prompt for one request; several segments are numbered with marker lines."""
+    if len(c_codes) == 1:
+        return PROMPT_TEMPLATE.format(c_code=c_codes[0])
+    parts = [f"{SEGMENT_MARKER.format(index=index)}\n{c_code}" for index, c_code in enumerate(c_codes)]
+    return BATCH_PROMPT_TEMPLATE.format(count=len(c_codes), example=SEGMENT_MARKER.format(index=0),
+                                        c_code="\n\n".join(parts))
+
+def extract_rust_code(response_text):
+    """Extracts clean Rust code from API response."""
+    rust_code = response_text.strip()
+
+    # Remove code block markers
+    if rust_code.startswith("```rust"):
+        rust_code = rust_code[len("```rust"):]
+    elif rust_code.startswith("```"):
+        rust_code = rust_code[len("```"):]
+
+    if rust_code.endswith("```"):
+        rust_code = rust_code[:-len("```")]
+
+    rust_code = rust_code.strip()
+
+    # Filter out comment lines and empty lines
+    cleaned_lines = []
+    for line in rust_code.split('\n'):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("//"):
+            continue
+        cleaned_lines.append(line)
+
+    return '\n'.join(cleaned_lines)
+
+def split_response(chunks, count):
+    """Splits a streamed multi-segment response at its marker lines.
+
+    Yields (index, rust_code) for each segment as soon as the marker of the
+    next segment arrives, so callers can act on early segments while the
+    model is still writing later ones. Segments missing from the response
+    are yielded as TranslationError.
+    """
+    text = ""
+    starts = {}
+    emitted = set()
+
+    def section(index, end):
+        return extract_rust_code(text[starts[index]:end].replace("```rust", "").replace("```", ""))
+
+    for chunk in chunks:
+        text += chunk
+        markers = [match for match in SEGMENT_MARKER_PATTERN.finditer(text) if int(match.group(1)) < count]
+        for match in markers:
+            starts.setdefault(int(match.group(1)), match.end())
+        for current, following in zip(markers, markers[1:]):
+            index = int(current.group(1))
+            if index not in emitted and starts[index] == current.end():
+                emitted.add(index)
+                yield index, section(index, following.start())
+
+    for index in sorted(starts):
+        if index not in emitted:
+            emitted.add(index)
+            yield index, section(index, len(text))
+    for index in range(count):
+        if index not in emitted:
+            yield index, TranslationError(f"Response is missing segment {index} of {count}")
+
+class TranslatorBackend:
+    """Base class of the translation backends.
+
+    A backend translates a batch of C segments per request. `stream` yields
+    (index, result) pairs as each segment's translation becomes available;
+    a result is the Rust code or the exception for that segment, and errors
+    affecting the whole request are raised. Prompt-based backends only need
+    to implement `generate` (and optionally `generate_stream`).
+    """
+
+    max_batch_segments = 1
+    max_batch_tokens = None
+    _cache_namespace = None
+
+    @property
+    def cache_namespace(self):
+        """Identifies the model and prompt behind this backend in translation cache keys."""
+        return self._cache_namespace or type(self).__qualname__
+
+    @cache_namespace.setter
+    def cache_namespace(self, value):
+        self._cache_namespace = value
+
+    def generate(self, prompt):
+        """Sends one prompt to the model and returns its full response text."""
+        raise NotImplementedError
+
+    def generate_stream(self, prompt):
+        """Yields the model's response text in chunks; the default waits for the full response."""
+        yield self.generate(prompt)
+
+    def stream(self, c_codes):
+        """Translates a batch of segments in one request, yielding results as they arrive."""
+        chunks = self.generate_stream(build_prompt(c_codes))
+        if len(c_codes) == 1:
+            yield 0, extract_rust_code("".join(chunks))
+        else:
+            yield from split_response(chunks, len(c_codes))
+
+    def submit(self, c_codes):
+        """Translates a batch of segments in one request and returns the result of each, in order."""
+        results = [None] * len(c_codes)
+        for index, result in self.stream(c_codes):
+            results[index] = result
+        return results
+
+    def __call__(self, c_code):
+        """Translates a single segment, raising its error if it failed."""
+        result = self.submit([c_code])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class CallableBackend(TranslatorBackend):
+    """Adapts a plain function from C code to Rust code into a backend that sends one segment per request."""
+
+    def __init__(self, translate):
+        self.translate = translate
+        self.cache_namespace = getattr(translate, "cache_namespace", None) or getattr(
+            translate, "__qualname__", type(translate).__name__)
+
+    def stream(self, c_codes):
+        for index, c_code in enumerate(c_codes):
+            try:
+                yield index, self.translate(c_code)
+            except Exception as e:
+                yield index, e
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(model_name=MODEL_NAME):
+    """Returns the shared Gemini model client, configuring the API on first use."""
+    with _models_lock:
+        if model_name not in _models:
+            # Imported lazily: the SDK is slow to import and cached runs never need it
+            import google.generativeai as genai
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+class GeminiBackend(TranslatorBackend):
+    """Remote Gemini backend; responses are streamed so batched segments complete one by one."""
+
+    max_batch_segments = DEFAULT_BATCH_SEGMENTS
+    max_batch_tokens = DEFAULT_BATCH_TOKENS
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self.cache_namespace = f"{model_name}:{PROMPT_VERSION}"
+
+    def generate(self, prompt):
+        return get_model(self.model_name).generate_content(prompt).text
+
+    def generate_stream(self, prompt):
+        for chunk in get_model(self.model_name).generate_content(prompt, stream=True):
+            yield chunk.text
+
+class HTTPBackend(TranslatorBackend):
+    """Backend for a local or self-hosted model behind an OpenAI-compatible chat completions endpoint.
+
+    Works with llama.cpp, vLLM, Ollama and similar servers, or with any local
+    stand-in server that speaks the same protocol.
+    """
+
+    max_batch_segments = DEFAULT_BATCH_SEGMENTS
+    max_batch_tokens = DEFAULT_BATCH_TOKENS
+
+    def __init__(self, url=DEFAULT_HTTP_URL, model=DEFAULT_HTTP_MODEL, api_key=None,
+                 timeout=DEFAULT_HTTP_TIMEOUT, stream=True):
+        self.url = url
+        self.model = model
+        self.api_key = api_key or os.getenv("TRANSLATOR_API_KEY")
+        self.timeout = timeout
+        self.streaming = stream
+        self.cache_namespace = f"http:{model}:{PROMPT_VERSION}"
+
+    def request(self, prompt, stream):
+        body = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0,
+            "stream": stream,
+        }
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode(), headers=headers)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def generate(self, prompt):
+        with self.request(prompt, stream=False) as response:
+            reply = json.load(response)
+        return reply["choices"][0]["message"]["content"]
+
+    def generate_stream(self, prompt):
+        if not self.streaming:
+            yield self.generate(prompt)
+            return
+        # Server-sent events: one "data: {json}" line per delta, terminated by "data: [DONE]"
+        with self.request(prompt, stream=True) as response:
+            for line in response:
+                line = line.decode().strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+
+BACKENDS = ("gemini", "http", "mock")
+
+def create_backend(name, **options):
+    """Creates a backend by name: "gemini", "http" or "mock" (the offline FakeTranslator)."""
+    if name == "gemini":
+        return GeminiBackend(**options)
+    if name == "http":
+        return HTTPBackend(**options)
+    if name == "mock":
+        from translator.fake import FakeTranslator
+        return FakeTranslator(**options)
+    raise ValueError(f"Unknown translator backend: {name}")
+
+def as_backend(translate):
+    """Returns translate as a backend: the default Gemini backend for None, wrapped if it is a plain function."""
+    if translate is None:
+        return GeminiBackend()
+    if isinstance(translate, TranslatorBackend):
+        return translate
+    return CallableBackend(translate)
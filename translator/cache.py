@@ -0,0 +1,61 @@
+import os
+import re
+import hashlib
+from preprocessor.lru_store import LRUStore
+
+DEFAULT_CACHE_DIR = ".translation_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+LINEMARKER_PATTERN = re.compile(r'^#\s*\d+\s+".*"')
+# String and character literals are matched first so whitespace inside them is kept as is
+WHITESPACE_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|(\s+)')
+
+def collapse_whitespace(line):
+    return WHITESPACE_PATTERN.sub(lambda m: " " if m.group(1) else m.group(0), line)
+
+def normalize_segment(c_code):
+    """Normalizes segment text so formatting-only edits map to the same cache key."""
+    lines = []
+    for line in c_code.splitlines():
+        if LINEMARKER_PATTERN.match(line):
+            continue
+        line = collapse_whitespace(line).strip()
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+def cache_key(c_code, namespace):
+    """Hashes the normalized segment together with the translator namespace (model + prompt)."""
+    digest = hashlib.sha256()
+    digest.update(namespace.encode())
+    digest.update(b"\0")
+    digest.update(normalize_segment(c_code).encode())
+    return digest.hexdigest()
+
+class TranslationCache(LRUStore):
+    """Persistent SQLite cache of translations with size-bounded LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        super().__init__(os.path.join(cache_dir, "translations.sqlite"), "entries", max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached translation for key, or None on a miss."""
+        value = super().get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores a translation and evicts least recently used entries beyond max_bytes."""
+        super().put(key, value, len(value.encode()))
+
+    def stats(self):
+        """Returns hit/miss counters and the current cache size."""
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes()}
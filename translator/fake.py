@@ -0,0 +1,38 @@
+import time
+import random
+import threading
+from translator.backends import TranslatorBackend, DEFAULT_BATCH_SEGMENTS, DEFAULT_BATCH_TOKENS
+
+class FakeTranslator(TranslatorBackend):
+    """Deterministic offline backend standing in for a model, with injected latency and transient failures.
+
+    Every request costs `latency` seconds (plus up to `jitter`) however many
+    segments it carries, plus `segment_latency` per segment, so batching
+    amortizes the per-request overhead as it would with a real model.
+    """
+
+    cache_namespace = "fake"
+    max_batch_segments = DEFAULT_BATCH_SEGMENTS
+    max_batch_tokens = DEFAULT_BATCH_TOKENS
+
+    def __init__(self, latency=0.1, jitter=0.0, failure_rate=0.0, seed=0, segment_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.segment_latency = segment_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def stream(self, c_codes):
+        with self.lock:
+            self.calls += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.failure_rate
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("Injected translator failure")
+        for index, c_code in enumerate(c_codes):
+            if self.segment_latency:
+                time.sleep(self.segment_latency)
+            yield index, "\n".join(f"// {line}" for line in c_code.splitlines())
@@ -0,0 +1,68 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Segment outcomes recorded in the journal
+TRANSLATED, CACHED, FAILED = "translated", "cached", "failed"
+
+def load_journal(path):
+    """Returns the latest journal entry of every segment; a torn last line from a crash is ignored."""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Ignoring incomplete journal line in {path}")
+                continue
+            entries[entry["segment_id"]] = entry
+    return entries
+
+def completed_segments(entries, segment_hashes, rust_dir):
+    """Finds segments a previous run finished whose source is unchanged and whose .rs file still exists."""
+    return {
+        segment_id for segment_id, entry in entries.items()
+        if entry["status"] in (TRANSLATED, CACHED)
+        and entry.get("hash") is not None and entry.get("hash") == segment_hashes.get(segment_id)
+        and os.path.exists(os.path.join(rust_dir, f"{segment_id}.rs"))
+    }
+
+class RunJournal:
+    """Append-only JSONL record of every segment outcome, flushed as each segment completes.
+
+    Each line holds the segment id, its status, how long it took (including
+    retries), the error class and message for failures, and the hash of the
+    segment source so a resumed run can tell whether the entry still applies.
+    """
+
+    def __init__(self, path, segment_hashes=None, resume=False):
+        self.path = path
+        self.segment_hashes = segment_hashes or {}
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a" if resume else "w")
+
+    def record(self, segment_id, status, duration=0.0, error=None):
+        entry = {
+            "segment_id": segment_id,
+            "status": status,
+            "duration": round(duration, 6),
+            "hash": self.segment_hashes.get(segment_id),
+            "time": round(time.time(), 3),
+        }
+        if error is not None:
+            entry["error"] = type(error).__name__
+            entry["message"] = str(error)
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
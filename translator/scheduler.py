@@ -0,0 +1,186 @@
+import time
+import random
+import queue
+import logging
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from preprocessor.profiling import profiler
+from preprocessor.metadata import BYTES_PER_TOKEN, segment_size
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+class TokenBucket:
+    """Thread-safe token bucket limiting how many translator requests start per second."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_time = (1.0 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+def backoff_delay(attempt, backoff=DEFAULT_BACKOFF):
+    """Returns the jittered exponential backoff before retry number attempt + 1."""
+    return min(MAX_BACKOFF, backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def dependency_map(segments):
+    """Maps every segment id to the ids of the other segments it depends on."""
+    segment_ids = {segment["segment_id"] for segment in segments}
+    return {
+        segment["segment_id"]: {
+            dep for dep in segment.get("dependencies", [])
+            if dep in segment_ids and dep != segment["segment_id"]
+        }
+        for segment in segments
+    }
+
+def segment_tokens(segment):
+    return segment_size(segment["spans"]) // BYTES_PER_TOKEN
+
+def make_batches(segment_ids, by_id, batch_size=1, batch_tokens=None, idle_workers=1):
+    """Groups ready segments into requests of at most batch_size segments and batch_tokens tokens.
+
+    Batches are kept small enough that every idle worker gets one, so batching
+    never serializes work that could run in parallel.
+    """
+    size = min(batch_size, max(1, -(-len(segment_ids) // max(1, idle_workers))))
+    batches = []
+    current, current_tokens = [], 0
+    for segment_id in segment_ids:
+        tokens = segment_tokens(by_id[segment_id])
+        full = len(current) >= size or (batch_tokens and current_tokens + tokens > batch_tokens)
+        if current and full:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(segment_id)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def schedule_segments(segments, translate, max_workers=DEFAULT_WORKERS, rate_limiter=None,
+                      retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, on_complete=None,
+                      batch_size=1, batch_tokens=None):
+    """Translates segments on a thread pool, starting each one once its dependencies are done.
+
+    Ready segments are sent in batches of up to `batch_size` segments (and
+    `batch_tokens` estimated tokens). `translate` receives a list of segment
+    dicts and yields (segment_id, result) pairs as each one finishes; a result
+    is the Rust code or an exception for that segment. Dependents are released
+    as soon as a segment is yielded, even while the rest of its batch is still
+    being translated. Segments that failed are retried with backoff, the whole
+    remainder of the batch when the request itself failed. If the remaining
+    segments form a cycle the first one in metadata order is released so the
+    run always makes progress.
+    Returns a dict of segment_id -> Rust code (or exception for failed segments).
+    """
+    deps = dependency_map(segments)
+    by_id = {segment["segment_id"]: segment for segment in segments}
+    dependents = {segment_id: [] for segment_id in deps}
+    remaining = {}
+    for segment_id, segment_deps in deps.items():
+        remaining[segment_id] = len(segment_deps)
+        for dep in segment_deps:
+            dependents[dep].append(segment_id)
+
+    order = [segment["segment_id"] for segment in segments]
+    ready = [segment_id for segment_id in order if remaining[segment_id] == 0]
+    started = set()
+    results = {}
+    # Workers report each finished segment, then None once their whole batch is done
+    finished = queue.Queue()
+    # Set when the run is aborted; workers then stop before their next request, retry or result
+    stop = threading.Event()
+
+    def run(batch):
+        pending = list(batch)
+        errors = {}
+        attempt = 0
+        try:
+            while not stop.is_set():
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+                    if stop.is_set():
+                        break
+                try:
+                    with closing(translate([by_id[segment_id] for segment_id in pending])) as stream:
+                        for segment_id, result in stream:
+                            if stop.is_set():
+                                break
+                            if isinstance(result, Exception):
+                                errors[segment_id] = result
+                            elif segment_id in pending:
+                                pending.remove(segment_id)
+                                finished.put((segment_id, result))
+                except Exception as e:
+                    errors.update((segment_id, e) for segment_id in pending)
+                if not pending or attempt >= retries or stop.is_set():
+                    break
+                error = errors.get(pending[0]) or RuntimeError("Translator returned no result")
+                delay = backoff_delay(attempt, backoff)
+                attempt += 1
+                profiler.count("retries")
+                logging.warning(f"Translation attempt {attempt} of {len(pending)} segment(s) failed ({error}); "
+                                f"retrying in {delay:.2f}s")
+                stop.wait(delay)
+        finally:
+            for segment_id in pending:
+                finished.put((segment_id, errors.get(segment_id) or RuntimeError("Translator returned no result")))
+            finished.put(None)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        running = 0
+        while len(results) < len(order):
+            if not ready and not running:
+                segment_id = next(segment_id for segment_id in order if segment_id not in started)
+                logging.warning(f"Dependency cycle detected; releasing segment {segment_id}")
+                ready.append(segment_id)
+
+            if ready:
+                started.update(ready)
+                for batch in make_batches(ready, by_id, batch_size, batch_tokens, max_workers - running):
+                    executor.submit(run, batch)
+                    running += 1
+                ready = []
+
+            event = finished.get()
+            if event is None:
+                running -= 1
+                continue
+            segment_id, result = event
+            results[segment_id] = result
+            if isinstance(result, Exception):
+                logging.error(f"Translation of {segment_id} failed: {result}")
+            for dependent in dependents[segment_id]:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0 and dependent not in started:
+                    ready.append(dependent)
+            if on_complete is not None:
+                on_complete(segment_id, result)
+    except BaseException:
+        # Ctrl-C or a failing callback: drop queued batches, stop running ones at their next
+        # checkpoint and wait for them, so callers can close the segment store and cache safely
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    return results
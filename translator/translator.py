@@ -1,7 +1,14 @@
 import json
-import os
-import google.generativeai as genai
+import time
+import logging
 from dotenv import load_dotenv
+from translator.scheduler import TokenBucket, schedule_segments, DEFAULT_WORKERS, DEFAULT_RETRIES
+from translator.cache import cache_key
+from translator.journal import TRANSLATED, CACHED, FAILED
+from translator.backends import as_backend
+from preprocessor.segment_store import SegmentStore
+from preprocessor.profiling import profiler
+from preprocessor.metadata import BYTES_PER_TOKEN
 
 load_dotenv()
 
@@ -11,89 +18,104 @@ def read_metadata(metadata_file):
         metadata = json.load(f)
     return metadata["segments"]
 
-def read_segment(file_path):
-    """Reads a segment C file."""
-    with open(file_path, "r") as f:
-        return f.read()
+def read_segment(segment, store):
+    """Reads a segment's C source from the segment store."""
+    return store.read(segment["spans"])
 
+def cache_namespace(translate):
+    """Identifies the model and prompt behind a translate function or backend for cache keys."""
+    return as_backend(translate).cache_namespace
 
+def process_segments(metadata_file, translate=None, max_workers=DEFAULT_WORKERS,
+                     requests_per_second=None, retries=DEFAULT_RETRIES, cache=None,
+                     segment_ids=None, on_complete=None, batch_size=None, batch_tokens=None,
+                     journal=None):
+    """Processes metadata and translates segments to Rust concurrently in dependency order.
 
-def translate_to_rust(c_code):
-    """Translates C code to Rust using Gemini API."""
-    try:
-        # Configure the Gemini API
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        
-        # Create the model instance
-        model = genai.GenerativeModel('gemini-pro')
-        
-        # Create the system instruction prompt
-        prompt = f"""You are an expert programmer experienced in C and Rust conversion as per 2025 standards.
-        Please translate the following C code to safe, idiomatic Rust code.
+    `translate` is a backend (see translator.backends) or a plain function from
+    C code to Rust, and defaults to the Gemini backend; pass the offline mock
+    (translator.fake) to exercise the scheduler without network access.
+    Independent segments are sent in multi-segment requests of up to
+    `batch_size` segments and `batch_tokens` estimated tokens, defaulting to
+    the backend's own limits.
+    With a `cache` (translator.cache.TranslationCache), segments whose normalized
+    source was translated before skip the translator call entirely.
+    `segment_ids` restricts translation to a subset of segments.
+    `on_complete(segment_id, result)` is called as each segment finishes, with
+    the Rust code or, for a segment that failed after all retries, the
+    exception; each outcome is also appended to `journal`
+    (translator.journal.RunJournal) when one is given.
+    Returns a dict of segment_id -> Rust code or exception.
+    """
+    segments = read_metadata(metadata_file)
+    if segment_ids is not None:
+        segments = [segment for segment in segments if segment["segment_id"] in segment_ids]
+    backend = as_backend(translate)
+    namespace = cache_namespace(translate)
+    batch_size = batch_size or backend.max_batch_segments
+    batch_tokens = batch_tokens or backend.max_batch_tokens
+    rate_limiter = TokenBucket(requests_per_second) if requests_per_second else None
 
-        Requirements:
+    translated_segments = {}
+    started = {}
 
-       Requirements:
-        1. Use proper ownership semantics
-        2. Convert pointers to Rust-safe constructs
-        3. Add proper error handling
-        4. Preserve original functionality
-        5. Do not include ANY comments or explanations
-        6. Do not expand stray function calls (segments will be merged)
-        7. Output ONLY the Rust code with no additional text
-        
-                
-        C Code:
-        {c_code}
-        
-        Rust Translation:"""
-        
-        # Generate the response
-        response = model.generate_content(prompt)
-        
-        # Extract the Rust code portion from the response
-        rust_code = extract_rust_code(response.text)
-        return rust_code
-        
-    except Exception as e:
-        return f"// Translation failed: {str(e)}"
+    def complete(segment_id, result, status=TRANSLATED):
+        duration = time.monotonic() - started.pop(segment_id, time.monotonic())
+        if isinstance(result, Exception):
+            profiler.count("failures")
+            status = FAILED
+        if journal is not None:
+            journal.record(segment_id, status, duration, result if status == FAILED else None)
+        translated_segments[segment_id] = result
+        if on_complete is not None:
+            on_complete(segment_id, result)
 
-def extract_rust_code(response_text):
-    """Extracts clean Rust code from API response."""
-    rust_code = response_text.strip()
-    
-    # Remove code block markers
-    if rust_code.startswith("```rust"):
-        rust_code = rust_code[len("```rust"):]
-    elif rust_code.startswith("```"):
-        rust_code = rust_code[len("```"):]
-    
-    if rust_code.endswith("```"):
-        rust_code = rust_code[:-len("```")]
-    
-    rust_code = rust_code.strip()
-    
-    # Filter out comment lines and empty lines
-    cleaned_lines = []
-    for line in rust_code.split('\n'):
-        stripped = line.strip()
-        if not stripped or stripped.startswith("//"):
-            continue
-        cleaned_lines.append(line)
-    
-    return '\n'.join(cleaned_lines)
+    store = SegmentStore()
+    uncached = []
+    for segment in segments:
+        cached = None
+        if cache is not None:
+            cached = cache.get(cache_key(read_segment(segment, store), namespace))
+            if cached is None:
+                profiler.count("cache_misses")
+        if cached is not None:
+            profiler.count("cache_hits")
+            complete(segment["segment_id"], cached, CACHED)
+        else:
+            uncached.append(segment)
 
+    def translate_batch(batch):
+        now = time.monotonic()
+        for segment in batch:
+            # Durations run from the first attempt, so they include retries
+            started.setdefault(segment["segment_id"], now)
+        c_codes = [read_segment(segment, store) for segment in batch]
+        c_bytes = sum(len(c_code) for c_code in c_codes)
+        name = batch[0]["segment_id"] + (f" +{len(batch) - 1}" if len(batch) > 1 else "")
+        with profiler.span(f"translate {name}", category="segment", segments=len(batch),
+                           c_bytes=c_bytes, est_tokens=c_bytes // BYTES_PER_TOKEN) as args:
+            profiler.count("requests")
+            args["rust_bytes"] = 0
+            for index, rust_code in backend.stream(c_codes):
+                if not isinstance(rust_code, Exception):
+                    profiler.count("translated_segments")
+                    profiler.count("c_bytes", len(c_codes[index]))
+                    profiler.count("rust_bytes", len(rust_code))
+                    args["rust_bytes"] += len(rust_code)
+                    if cache is not None:
+                        cache.put(cache_key(c_codes[index], namespace), rust_code)
+                yield batch[index]["segment_id"], rust_code
 
-def process_segments(metadata_file):
-    """Processes metadata and translates segments to Rust."""
-    segments = read_metadata(metadata_file)
-    
-    translated_segments = {}
-
-    for segment in segments:
-        c_code = read_segment(segment["file"])
-        rust_code = translate_to_rust(c_code)
-        translated_segments[segment["segment_id"]] = rust_code
+    try:
+        if uncached:
+            schedule_segments(uncached, translate_batch, max_workers=max_workers,
+                              rate_limiter=rate_limiter, retries=retries, on_complete=complete,
+                              batch_size=batch_size, batch_tokens=batch_tokens)
+    finally:
+        store.close()
+    if cache is not None:
+        stats = cache.stats()
+        logging.info(f"Translation cache: {stats['hits']} hits, {stats['misses']} misses")
 
     return translated_segments
 
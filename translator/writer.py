@@ -0,0 +1,125 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from translator.journal import TRANSLATED, FAILED
+
+# mkstemp creates files readable only by their owner; outputs should be readable like any other file
+OUTPUT_MODE = 0o644
+
+def atomic_write_json(path, data, indent=4):
+    """Writes JSON to a temporary file in the same directory and renames it over path."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    os.chmod(tmp_path, OUTPUT_MODE)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class RustOutputWriter:
+    """Streams translated segments to per-segment .rs files and the combined output.rs.
+
+    Segments may complete in any order; each one is written to its own file
+    immediately and appended to output.rs as soon as every segment before it
+    in metadata order has been written. Failed segments are left out of
+    output.rs and marked with their error in metadata. Metadata is flushed
+    once, atomically, when the writer is closed.
+    """
+
+    def __init__(self, metadata, metadata_file, rust_dir, output_file):
+        self.metadata = metadata
+        self.metadata_file = metadata_file
+        self.rust_dir = rust_dir
+        self.output_file = output_file
+        self.segments = {segment["segment_id"]: segment for segment in metadata["segments"]}
+        self.order = [segment["segment_id"] for segment in metadata["segments"]]
+        self.position = 0
+        self.ready = {}
+        self.lock = threading.Lock()
+
+        os.makedirs(rust_dir, exist_ok=True)
+        fd, self.tmp_output = tempfile.mkstemp(dir=os.path.dirname(output_file) or ".",
+                                               prefix=".tmp-", suffix=".rs")
+        os.chmod(self.tmp_output, OUTPUT_MODE)
+        self.output = os.fdopen(fd, "w")
+
+    def write(self, segment_id, rust_code):
+        """Writes one translated segment and streams any newly contiguous segments to output.rs."""
+        rust_file_name = f"{segment_id}.rs"
+        rust_file_path = os.path.join(self.rust_dir, rust_file_name)
+        with open(rust_file_path, "w") as f:
+            f.write(rust_code)
+        logging.info(f"Written Rust code for {segment_id} to {rust_file_path}")
+
+        with self.lock:
+            segment = self.segments[segment_id]
+            segment["rust_file"] = rust_file_name
+            segment["status"] = TRANSLATED
+            segment.pop("error", None)
+            self.ready[segment_id] = rust_code
+            self._stream()
+
+    def fail(self, segment_id, error):
+        """Marks a segment as failed in metadata; it gets no .rs file and is skipped in output.rs."""
+        with self.lock:
+            segment = self.segments[segment_id]
+            segment["rust_file"] = None
+            segment["status"] = FAILED
+            segment["error"] = {"type": type(error).__name__, "message": str(error)}
+            self.ready[segment_id] = None
+            self._stream()
+
+    def complete(self, segment_id, result):
+        """Writes a translation result, or records the failure if result is an exception."""
+        if isinstance(result, Exception):
+            self.fail(segment_id, result)
+        else:
+            self.write(segment_id, result)
+
+    def reuse(self, segment_id):
+        """Streams a segment whose .rs file from a previous run is still up to date."""
+        rust_file_name = self.segments[segment_id].get("rust_file") or f"{segment_id}.rs"
+        with open(os.path.join(self.rust_dir, rust_file_name), "r") as f:
+            rust_code = f.read()
+        with self.lock:
+            self.segments[segment_id]["status"] = TRANSLATED
+            self.ready[segment_id] = rust_code
+            self._stream()
+
+    def _stream(self):
+        while self.position < len(self.order) and self.order[self.position] in self.ready:
+            rust_code = self.ready.pop(self.order[self.position])
+            if rust_code is not None:
+                self.output.write(rust_code + "\n\n")
+            self.position += 1
+
+    def close(self):
+        """Finishes output.rs and flushes metadata.json; segments never written are skipped."""
+        with self.lock:
+            for segment_id in self.order[self.position:]:
+                if segment_id not in self.ready:
+                    logging.warning(f"Rust code for segment {segment_id} missing; skipped in {self.output_file}")
+                elif self.ready[segment_id] is not None:
+                    self.output.write(self.ready.pop(segment_id) + "\n\n")
+            self.position = len(self.order)
+
+            self.output.close()
+            os.replace(self.tmp_output, self.output_file)
+            atomic_write_json(self.metadata_file, self.metadata)
+        failed = [segment_id for segment_id, segment in self.segments.items() if segment.get("status") == FAILED]
+        if failed:
+            logging.warning(f"{len(failed)} segment(s) failed and are marked in {self.metadata_file}: "
+                            f"{', '.join(failed[:10])}{' ...' if len(failed) > 10 else ''}")
+        logging.info(f"Combined Rust code written to {self.output_file}")
+
+    def abort(self):
+        """Discards the partial output.rs of an interrupted run; per-segment .rs files are kept."""
+        with self.lock:
+            self.output.close()
+            if os.path.exists(self.tmp_output):
+                os.unlink(self.tmp_output)